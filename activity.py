@@ -0,0 +1,180 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Write-behind buffer for user activity
+# Coalesces 'last' and name changes per user and writes them in one
+# _bulk_docs request on a timer and at shutdown
+
+import time
+import atexit
+import threading
+import brickdb
+import groups
+from settings import code
+from util import log
+
+# (group, user_id) => { 'last', 'name' }
+buffer = {}
+lock = threading.Lock()
+
+interval = 60
+flusher = None
+
+
+# Starts the flush timer
+def start(every=60):
+    global interval, flusher
+
+    interval = every
+    if flusher is None:
+        flusher = threading.Thread(target=run, daemon=True)
+        flusher.start()
+        atexit.register(flush)
+
+
+# Flushes on a timer
+def run():
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception as err:
+            log("ERROR - User activity flush failed - " + str(err))
+
+
+# Records activity for an existing user
+def record(group, userid, name=None, last=None):
+
+    with lock:
+        entry = buffer.setdefault((group, userid), {})
+        entry['last'] = last or time.time()
+        if name:
+            entry['name'] = name
+
+
+# Returns a copy of the buffered activity for a user
+# None if nothing is waiting to be written
+def buffered(group, userid):
+    with lock:
+        entry = buffer.get((group, userid))
+        if entry is None:
+            return None
+        return dict(entry)
+
+
+# Returns the doc fields for an activity entry
+def fields(entry):
+
+    result = { 'last' : entry['last'] }
+    if 'name' in entry:
+        result['subject'] = entry['name']
+        result['subject_lc'] = entry['name'].lower()
+
+    return result
+
+
+# Returns the updated doc for a cached user
+def userdoc(group, userid, entry):
+
+    if group not in groups.shards:
+        return None
+
+    with groups.lock(group):
+        member = groups.get('users', group).get(userid)
+
+        # Unknown or not yet stored
+        if member is None or '_id' not in member:
+            return None
+
+        doc = member.copy()
+
+    doc.pop('name', None)
+    doc['subject'] = member['name']
+    doc['subject_lc'] = member['name'].lower()
+    doc.update(fields(entry))
+    return doc
+
+
+# Returns entries to the buffer unless newer activity was recorded
+def requeue(entries):
+    with lock:
+        for key in entries.keys():
+            if key not in buffer:
+                buffer[key] = entries[key]
+
+
+# Writes buffered activity
+def flush():
+
+    # Take buffer
+    with lock:
+        pending = dict(buffer)
+        buffer.clear()
+
+    if not len(pending):
+        return { 'code' : code['success'] }
+
+    keys = []
+    docs = []
+    for key in pending.keys():
+        doc = userdoc(key[0], key[1], pending[key])
+        if doc is not None:
+            keys.append(key)
+            docs.append(doc)
+
+    if not len(docs):
+        return { 'code' : code['success'] }
+
+    # Write
+    resp = brickdb.post_docs(docs)
+    if resp['code'] != code['success']:
+        requeue(pending)
+        return resp
+
+    # Conflicts - apply the changes to the current revisions and retry once
+    conflicts = [ (key, doc) for key, doc, row in zip(keys, docs, resp['result']) if row['code'] != code['success'] ]
+    written = len(docs) - len(conflicts)
+    if len(conflicts):
+        log(len(conflicts), 'user update conflict(s) - retrying')
+        current = brickdb.fetch([ doc['_id'] for key, doc in conflicts ])
+
+        keys = []
+        docs = []
+        for (key, doc), latest in zip(conflicts, current):
+
+            # Removed since
+            if latest['code'] != code['success']:
+                continue
+
+            doc = latest['result']
+            doc.update(fields(pending[key]))
+            keys.append(key)
+            docs.append(doc)
+
+        if len(docs):
+            resp = brickdb.post_docs(docs)
+            if resp['code'] != code['success']:
+                requeue(dict([ (key, pending[key]) for key in keys ]))
+                return resp
+            failed = [ key for key, row in zip(keys, resp['result']) if row['code'] != code['success'] ]
+            requeue(dict([ (key, pending[key]) for key in failed ]))
+            written += len(docs) - len(failed)
+
+    log('User activity saved for', written, 'user(s)')
+    return { 'code' : code['success'] }
@@ -0,0 +1,210 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Micro-benchmarks for message handling hot paths
+# Runs without a database or GroupMe connection
+# Syllable counts are checked against a fixed table first so tuning the
+# counting path can't silently change results
+# Usage: python benchmark.py [iterations]
+#        python benchmark.py --check
+
+import re
+import sys
+import time
+import settings
+
+# Load defaults before importing modules that read config
+settings.load_config()
+import parse
+import syllables
+
+# Command parsers in the order core.commands tries them
+commands = [ 'shutup', 'unshutup', 'restart', 'cache', 'protectvar', 'protect', 'syllables',
+             'syllablecount', 'query', 'lookup', 'literal', 'last', 'edit', 'delete', 'alias',
+             'unalias', 'merge', 'version', 'stats', 'listusers', 'listvars', 'more',
+             'setconfig', 'promote', 'addval', 'remvar', 'undo', 'refresh' ]
+
+# Typical addressed messages - mostly chatter, some commands
+messages = [
+    "what is the meaning of life?",
+    "how are you doing today",
+    "tell me about the weather in boston",
+    "that was pretty funny, thanks",
+    "I think pizza is better than tacos",
+    "can you believe what happened last night",
+    "lookup pizza",
+    "what was that?",
+    "list vars",
+    "forget that",
+    "#3 sub tacos => burritos",
+    "shut up for 5m",
+    "status",
+    "cache [don't know]",
+    "pizza ~= cheese",
+    "fire has 1 syllable"
+]
+
+
+# Chat messages as they arrive - every one is run through syllables.find
+chatter = messages + [
+    "lol",
+    "ok",
+    "brb getting coffee",
+    "Did anyone see the game last night? That ending was insane!!",
+    "meeting moved to 3pm, room 204",
+    "check out www.example.com/stuff it's pretty cool",
+    "AT&T dropped my call again...",
+    "I'll be there in 10-15 minutes",
+    "the new iPhone costs $1,099 which is ridiculous",
+    "happy birthday!!! 🎂",
+    "who wants pizza tonight?",
+    "that's what she said",
+    "my flight lands at 7:45, can someone pick me up",
+    "x > y but y < z",
+    "Back in 1999 we had dial-up",
+    "nope"
+]
+
+
+# Expected syllable counts - message => count
+# Matches the original engine except where noted
+expected = [
+    ("hello world", 3),
+    ("the quick brown fox jumps over the lazy dog", 11),
+    ("don't stop believing", 5),
+    ("supercalifragilisticexpialidocious", 13),
+    ("lol", 1),
+    ("FBI", 1),
+    ("a b c", 3),
+    ("brb getting coffee", 7),
+    ("happy birthday!!! 🎂", 5),
+    ("x > y but y < z", 10),
+    ("check out www.example.com/stuff it's pretty cool", 22),
+
+    # Numbers and ordinals
+    ("meeting moved to 3pm, room 204", 12),
+    ("the new iPhone costs $1,099 which is ridiculous", 11),
+    ("Back in 1999 we had dial-up", 12),
+    ("my flight lands at 7:45, can someone pick me up", 15),
+    ("I'll be there in 10-15 minutes", 6),
+    ("1st place", 4),
+    ("the 3rd time", 5),
+    ("she came in 22nd", 8),
+    ("101st airborne", 8),
+
+    # Negative numbers - the original engine counted "-5" as 5, now "minus five"
+    ("-5 degrees", 5),
+    ("it is -12 outside", 7),
+
+    # Ampersands - the original engine never returned on these
+    ("AT&T dropped my call again...", 9),
+    ("rock & roll", 3),
+    ("R&D budget", 5)
+]
+
+
+# Returns the messages whose syllable counts differ from the table
+def check_syllables():
+
+    syllables.load()
+    return [ (msg, count, syllables.find(msg)) for msg, count in expected if syllables.find(msg) != count ]
+
+
+# Runs every parser in order like the unrouted dispatcher
+# Patterns are passed as strings so re looks them up on each call
+def dispatch_strings(bag):
+    for cmd in commands:
+        pattern = parse.patterns[cmd]
+        re.match(pattern.pattern, bag['msg'], pattern.flags)
+
+
+# Runs every parser in order with the compiled patterns
+def dispatch_sequential(bag):
+    for cmd in commands:
+        getattr(parse, cmd)(bag)
+
+
+# Runs only the parsers of candidate commands
+def dispatch_routed(bag):
+    cands = parse.candidates(bag['msg'])
+    for cmd in commands:
+        if cmd in cands:
+            getattr(parse, cmd)(bag)
+
+
+# Returns microseconds per message for a dispatcher
+def measure(dispatch, iterations):
+
+    bags = [ { 'msg' : x, 'role' : 'user' } for x in messages ]
+    start = time.perf_counter()
+    for x in range(iterations):
+        for bag in bags:
+            dispatch(bag)
+    elapsed = time.perf_counter() - start
+
+    return elapsed / (iterations * len(bags)) * 1000000
+
+
+# Returns messages per second counting syllables
+# cold - per-word results are dropped before every pass over the corpus
+def measure_syllables(iterations, cold=False):
+
+    syllables.load()
+    elapsed = 0
+    for x in range(iterations):
+        if cold:
+            syllables.estimate.cache_clear()
+        start = time.perf_counter()
+        for msg in chatter:
+            syllables.find(msg)
+        elapsed += time.perf_counter() - start
+
+    return iterations * len(chatter) / elapsed
+
+
+def main(iterations=2000):
+
+    # Counts must match before timing them
+    mismatched = check_syllables()
+    if len(mismatched):
+        print('Syllable counts changed - message, expected, counted')
+        for x in mismatched:
+            print('  {0!r:<52} {1:3} {2:3}'.format(*x))
+        sys.exit(1)
+    print('Syllable counts match', len(expected), 'expected')
+
+    if iterations == 0:
+        return
+
+    print('Command dispatch - microseconds per message')
+    for name, dispatch in (('string patterns', dispatch_strings), ('sequential', dispatch_sequential), ('routed', dispatch_routed)):
+        print('  {0:<16} {1:8.2f}'.format(name, measure(dispatch, iterations)))
+
+    print('Syllable counting - messages per second')
+    for name, cold in (('cold cache', True), ('warm cache', False)):
+        print('  {0:<16} {1:8.0f}'.format(name, measure_syllables(iterations, cold)))
+
+
+if __name__ == '__main__':
+    if '--check' in sys.argv[1:]:
+        main(0)
+    elif len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -20,11 +20,13 @@
 import os
 import sys
 import json
-import time
 
 # Local Modules
 import core
 import util
+import groups
+import outbox
+import stats
 from util import log
 from core import config
 from core import bot
@@ -55,8 +57,13 @@ def handler(data=None):
 # Heartbeat
 def heartbeat():
 
-        resp = core.heartbeat()
-        post(resp)
+        # Check statistics against the database
+        stats.reconcile(core.config['stats_reconcile'])
+
+        # Each group
+        for group in groups.each():
+            resp = core.heartbeat()
+            post(resp)
 
 
 # Post text to Groupme
@@ -87,9 +94,5 @@ def post(posts):
     # Online
     else:
 
-        # Post Message
-        for msg in posts:
-            
-            # Response Delay
-            time.sleep(config['resp_delay'])
-            resp = bot.post(msg)
\ No newline at end of file
+        # Schedule Messages after the response delay
+        outbox.schedule(groups.get('bot'), posts, config['resp_delay'], config['post_window'], config['post_limit'])
\ No newline at end of file
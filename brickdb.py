@@ -19,6 +19,7 @@
 import sys
 import json
 import requests
+import sqlitedb
 from settings import config
 from settings import code
 from time import sleep
@@ -26,13 +27,28 @@ from util import *
 
 http = None
 
+# Local storage backend - None for Cloudant
+backend = None
+
+# Maximum IDs per _all_docs request
+fetch_chunk = 100
+
+# Called with the written or changed docs, including '_id' and '_rev'
+listeners = []
+
 # Check the status of the database
 def initialize(interface):
-    global http
+    global http, backend
 
     # Store http interface
     http = interface
 
+    # Local Database
+    if config['db_backend'] == 'sqlite':
+        backend = sqlitedb
+        return backend.initialize(config['db_path'] or config['db_name'] + '.db')
+    backend = None
+
     # Generate Database URL
     url = "https://{0}:{1}@{2}.cloudant.com/{3}".format(config['db_key'], config['db_pass'], config['db_user'], config['db_name'])
 
@@ -46,6 +62,7 @@ def initialize(interface):
             if resp.status_code != requests.codes.ok:
                 resp.raise_for_status()
             else:
+                seq = resp.json().get('update_seq')
                 retry = False
         except Exception as err:
             log("Unable to connect to database - " + str(err))
@@ -53,7 +70,7 @@ def initialize(interface):
             sleep(5)
 
     log("Connected to database")
-    return { 'code' : code['success'], 'url' : url}
+    return { 'code' : code['success'], 'url' : url, 'seq' : seq }
 
 
 # Queries a view for results
@@ -73,6 +90,10 @@ def query(dbview, key=None, fulldocs=False, limit=None, skip=None, group=None, g
 # Performs a search for values in a given field
 def search(index, field, value):
 
+    # Local Database
+    if backend:
+        return backend.search(index, field, value)
+
     # Send request
     url = config['db_url'] + '/_design/main/_search/' + index
     param = {   'include_docs' : json.dumps(True), 'q' : field + ':' + value }
@@ -86,6 +107,10 @@ def search(index, field, value):
 # Returns documents in a given view
 def view(design, dbview, include_docs=False, payload=None, limit=None, skip=None, group=None, group_level=None):
 
+    # Local Database
+    if backend:
+        return backend.view(design, dbview, include_docs, payload, limit=limit, skip=skip, group=group, group_level=group_level)
+
     # Base URL
     url = config['db_url'] + '/_design/' + design + '/_view/' + dbview
 
@@ -155,16 +180,56 @@ def post_docs(docs):
         log('Parameters must be a dictionary or list of dictionaries!')
         return { 'code' : code['failed'] }
 
-    # Build payload
-    payload = { 'docs' : docs }
-    url = config['db_url'] + '/_bulk_docs'
+    # Local Database
+    if backend:
+        resp = backend.post_docs(docs)
 
     # Post docs
-    resp = post(url, payload)
+    else:
+        payload = { 'docs' : docs }
+        url = config['db_url'] + '/_bulk_docs'
+        resp = post(url, payload)
+
+    # Notify listeners
+    if resp['code'] == code['success']:
+        written = []
+        for doc, row in zip(docs, resp['result']):
+            if type(row) is dict and row['code'] == code['success'] and 'id' in row:
+                doc = dict(doc)
+                doc['_id'] = row['id']
+                doc['_rev'] = row.get('rev')
+                written.append(doc)
+        notify(written)
 
     return resp
 
 
+# Passes written or changed docs to the listeners
+def notify(docs):
+
+    if not len(docs):
+        return
+
+    for listener in listeners:
+        try:
+            listener(docs)
+        except Exception as err:
+            log("Warning - database listener failed - " + str(err))
+
+
+# Returns changes made since a sequence number
+# Waits up to timeout seconds for the first change
+def changes(since=None, timeout=30):
+
+    url = config['db_url'] + '/_changes'
+    params = { 'feed' : 'longpoll', 'include_docs' : json.dumps(True), 'timeout' : timeout * 1000 }
+    if since is not None:
+        params['since'] = since
+
+    # Allow the wait on top of the normal read timeout
+    return get(url, params=params, timeout=(config['http_connect_timeout'], config['http_read_timeout'] + timeout))
+
+
 
 # Updates documents in the database
 # Returns the old docs
@@ -177,20 +242,29 @@ def update_docs(docs, undo=True):
         log('Parameters must be a dictionary or list of dictionaries!')
         return { 'code' : code['failed'] }
 
-    # Prepare Updates
-    payload = []
-    old = []
+    # Missing ID
     for x in docs:
-
-        # Missing ID
         if '_id' not in x.keys():
             log('Doc ID missing!')
             return { 'code' : code['failed'] }          
 
+    # Fetch current docs in one request
+    ids = [x['_id'] for x in docs if undo or '_rev' not in x.keys()]
+    if len(ids):
+        log('Fetching', len(ids), 'document(s)')
+        current = dict(zip(ids, fetch(ids)))
+
+    # Prepare Updates
+    payload = []
+    old = []
+    for x in docs:
+
         # Get docs
         if undo or '_rev' not in x.keys():
-            log('Fetching document ' + repr(x['_id']))
-            old_doc = fetch(x['_id'])['result']
+            old_doc = current[x['_id']].get('result')
+            if old_doc is None:
+                log('Document ' + repr(x['_id']) + ' not found!')
+                return { 'code' : code['failed'] }
             update = merge_dict(old_doc, x)
             if undo:
                 old.append(old_doc)
@@ -214,13 +288,34 @@ def update_docs(docs, undo=True):
 # Returns in the format provided
 def fetch(doc_ids):
 
+    # Local Database
+    if backend:
+        return backend.fetch(doc_ids)
+
     if type(doc_ids) != list:
         single = True
         doc_ids = [doc_ids]
     else:
         single = False
 
-    docs = [get(config['db_url'] + '/' + x) for x in doc_ids]
+    # Fetch in chunks
+    docs = []
+    url = config['db_url'] + '/_all_docs'
+    for x in range(0, len(doc_ids), fetch_chunk):
+        keys = doc_ids[x:x + fetch_chunk]
+        resp = post(url, { 'keys' : keys }, params={ 'include_docs' : json.dumps(True) })
+
+        # Failed request
+        if resp['code'] != code['success']:
+            docs += [{ 'code' : code['failed'] } for y in keys]
+            continue
+
+        # Missing or deleted docs have no doc
+        for row in resp['result']:
+            if row.get('doc') is None:
+                docs.append({ 'code' : code['failed'] })
+            else:
+                docs.append({ 'code' : code['success'], 'result' : row['doc'] })
 
     if single:
         return docs[0]
@@ -245,13 +340,13 @@ def post(url, payload, params=None):
     return resp
 
 # Performs an HTTP GET request
-def get(url, params=None):
+def get(url, params=None, timeout=None):
 
     # Debugging
     if config['debug']:
         debug("Getting...", { 'url' : url, 'params' : params })
 
-    resp = http.get(url, params=params)
+    resp = http.get(url, params=params, timeout=timeout)
     resp = parse(resp)
 
     # Debugging
@@ -279,7 +374,7 @@ def parse(resp):
     if type(result) is list:
         for x in result:
             if type(x) is dict and 'error' in x.keys():
-                log("Warning - database error! -", x['reason'])
+                log("Warning - database error! -", x.get('reason', x['error']))
                 x['code'] = code['failed']
             else:
                 x['code'] = code['success']
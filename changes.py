@@ -0,0 +1,70 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Database _changes feed follower
+# Passes changed docs to the brickdb listeners so local caches only apply
+# deltas instead of re-downloading whole views
+
+import time
+import threading
+import brickdb
+from settings import code
+from util import log
+
+# Seconds to wait on the feed before polling again
+poll = 30
+
+seq = None
+follower = None
+
+
+# Starts following changes after a sequence number
+def start(since=None):
+    global seq, follower
+
+    if follower is not None:
+        return
+
+    seq = since
+    follower = threading.Thread(target=run, daemon=True)
+    follower.start()
+    log('Following database changes')
+
+
+# Applies changes as they arrive
+def run():
+    global seq
+
+    while True:
+        try:
+            resp = brickdb.changes(seq, poll)
+        except Exception as err:
+            resp = { 'code' : code['failed'], 'error' : str(err) }
+
+        # Failure - retry after a delay
+        if resp['code'] != code['success']:
+            log('Change feed failed - reattempting in 5 seconds.')
+            time.sleep(5)
+            continue
+
+        # Apply changed docs
+        docs = [ x['doc'] for x in resp['result'].get('results', []) if 'doc' in x ]
+        brickdb.notify(docs)
+
+        seq = resp['result'].get('last_seq', seq)
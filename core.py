@@ -20,30 +20,42 @@
 import re
 import sys
 import time
+import json
+import hashlib
 import random
 import twitter
+import threading
 import requests
+import concurrent.futures
 
 # Bot Modules
 import util
 import parse
+import groups
 import groupme
+import activity
+import ingest
+import outbox
 import brickdb
+import changes
+import factoids
+import registry
+import stats
 import syllables
 import settings
+import transport
 from util import jprint, sq, dq, log
 from settings import config, code, source, roles, mods, defaults, forbidden, forbidden_var
 
 # HTTP Interface
-http = requests.Session()
+http = transport.http
 # Twitter
 t = None
-# Groupme
-bot = None
+# Groupme - bot for the selected group
+bot = groups.proxy('bot')
 
-# Load Plugins
+# Plugin names - modules are imported on first use by registry
 import plugins
-from plugins import *
 mods = plugins.__all__
 mods.remove('__init__')
 
@@ -51,14 +63,36 @@ mods.remove('__init__')
 version = '3.0.3'
 cache = {}
 var_cache = {}
-users = {}
-state = {}
+
+# Doc IDs => cache keys for applying deltas
+cache_ids = {}
+var_ids = {}
+syllable_ids = {}
+
+# Doc IDs => revision generation last applied
+doc_revs = {}
+
+# Per-group data - resolves to the group selected by the current thread
+users = groups.proxy('users')
+state = groups.proxy('state')
+
+# Guards the shared caches above between concurrent handlers
+# Per-group data is guarded by groups.lock()
+lock = threading.RLock()
+
+# Runs plugins side by side
+pool = None
+
+# Plugin => calls still running after their timeout
+# Each one holds a pool thread until it returns
+stragglers = {}
+straggling = threading.Lock()
 
 # Parses a web request to determine if a valid message was received.
 def process(data):
 
-    # Group Filter
-    if data['group_id'] != bot.groupid:
+    # Group Filter - selects the group for this thread
+    if not groups.select(data['group_id']):
         return
 
     # System Filter
@@ -78,19 +112,21 @@ def process(data):
     # if data['name'] in config['ignore']:
     #     log('Ignoring post by', repr(data['name']))
 
-    # Not the bot - Process
-    if data['name'] != bot.name:
-        data['history'] = state['history']
-        data = core(data)
+    with groups.lock():
 
-    if config['debug']:
-        util.debug('Process Result:', data)
+        # Not the bot - Process
+        if data['name'] != bot.name:
+            data['history'] = list(state['history'])
+            data = core(data)
 
-    # Outburst
-    refresh_outburst()
+        if config['debug']:
+            util.debug('Process Result:', data)
+
+        # Outburst
+        refresh_outburst()
 
-    # History
-    update_history(data)
+        # History
+        update_history(data)
 
     # Return response
     if 'response' in data.keys():
@@ -100,24 +136,26 @@ def process(data):
 # Runs interval based routines
 def heartbeat():
 
-    #DEBUG
-    if config['debug']:
-        util.debug('State:', state)
-        util.debug('Time:', time.time())
+    with groups.lock():
 
-    # Check if Shutup
-    if shutup():
-        return
+        #DEBUG
+        if config['debug']:
+            util.debug('State:', groups.get('state'))
+            util.debug('Time:', time.time())
+
+        # Check if Shutup
+        if shutup():
+            return
 
-    # Outburst
-    resp = outburst()
+        # Outburst
+        resp = outburst()
 
-    # Reminder
-    if not resp:
-        resp = reminder()
+        # Reminder
+        if not resp:
+            resp = reminder()
 
-    # Update State
-    updateState()
+        # Update State
+        updateState()
 
     return resp
 
@@ -320,6 +358,8 @@ def refresh(bag):
 
 # Refresh all caches
 def cache_all():
+    if config['fact_index']:
+        factoids.load()
     update_vars()
     update_users()
     update_cache()
@@ -552,21 +592,21 @@ def remove(index, bag):
 # Returns a status string
 def status_string():
 
-    stats = status()
+    info = status()
 
     # Version
-    resp = 'I am version ' + stats['version'] + '.  '
+    resp = 'I am version ' + info['version'] + '.  '
 
     # Up-Time
-    resp += "I've been awake for " + stats['uptime'] + '.  '
+    resp += "I've been awake for " + info['uptime'] + '.  '
 
     # X things about Y subjects
-    resp += 'I now know ' + str(stats['facts']) + ' things about ' + str(stats['subjects']) + ' subjects.  '
+    resp += 'I now know ' + str(info['facts']) + ' things about ' + str(info['subjects']) + ' subjects.  '
 
     # X objects carrying Y of them
 
     # I know of X people in this channel
-    resp += 'I know of ' + str(stats['users']) + ' users in this channel.  '
+    resp += 'I know of ' + str(info['users']) + ' users in this channel.  '
 
     # Being quiet right now, but I'll be back in about X
     if shutup():
@@ -581,21 +621,29 @@ def status_string():
 # Returns status data
 def status():
 
-    # Gather stats
-    stats = { 
-        'version'  : version,
-        'uptime'   : util.string_time(time.time() - state['uptime']),
-        'facts'    : fact_count(),
-        'subjects' : subj_count(),
-        'users'    : len(users.keys())}
+    with groups.lock():
+
+        # Gather stats - no database queries
+        result = { 
+            'version'  : version,
+            'uptime'   : util.string_time(time.time() - state['uptime']),
+            'facts'    : stats.facts(),
+            'subjects' : stats.subjects(),
+            'vars'     : len(var_cache.keys()),
+            'users'    : len(users.keys()),
+            'plugins'  : stats.plugin_counts(),
+            'imports'  : dict(registry.timings),
+            'queued'   : ingest.pending(),
+            'outbound' : len(outbox.pending()),
+            'http'     : transport.metrics()}
 
-    # Gather post history
-    max_posts = 3
-    history = state['history']
-    if len(history) > max_posts:
-        history = history[:max_posts - 1]
+        # Gather post history
+        max_posts = 3
+        history = state['history']
+        if len(history) > max_posts:
+            history = history[:max_posts - 1]
 
-    return stats
+    return result
 
 
 # Return the next page in the current list
@@ -617,8 +665,11 @@ def iterate():
 # Processes addressed commands
 def commands(bag):
 
+    # Commands that could match - only their parsers are run
+    cands = parse.candidates(bag['msg'])
+
     # Shutup
-    resp = parse.shutup(bag)
+    resp = parse.shutup(bag) if 'shutup' in cands else None
     if resp:
         auth = restricted(resp['permission'], bag['role'])
         if auth['code'] == code['success']:
@@ -629,7 +680,7 @@ def commands(bag):
 
 
     # Come Back - op only
-    if parse.unshutup(bag):
+    if 'unshutup' in cands and parse.unshutup(bag):
         if shutup() and restricted('op', bag['role'])['code'] == code['success']:
             shutup(0)
             log('Timeout ended by', bag['name'])
@@ -637,13 +688,13 @@ def commands(bag):
 
 
     # Restart - admin only
-    if parse.restart(bag):
+    if 'restart' in cands and parse.restart(bag):
         resp = restart(bag)
         return say(bag=bag, **resp)
 
 
     # Cache/UnCache - op only
-    match = parse.cache(bag)
+    match = parse.cache(bag) if 'cache' in cands else None
     if match:
 
         # Get subj
@@ -667,7 +718,7 @@ def commands(bag):
         return say(bag=bag, **resp)
 
     # Protect/Unprotect var - op only
-    match = parse.protectvar(bag)
+    match = parse.protectvar(bag) if 'protectvar' in cands else None
     if match:
 
         # Update Protect values
@@ -675,7 +726,7 @@ def commands(bag):
         return say(bag=bag, **resp)
 
     # Protect/Unprotect - op only
-    match = parse.protect(bag)
+    match = parse.protect(bag) if 'protect' in cands else None
     if match:
 
         # Get subj
@@ -693,7 +744,7 @@ def commands(bag):
         return say(bag=bag, **resp)
 
     # Syllables
-    match = parse.syllables(bag)
+    match = parse.syllables(bag) if 'syllables' in cands else None
     if match:
 
         # Update Syllables
@@ -702,7 +753,7 @@ def commands(bag):
 
 
     # How many syllables
-    subj = parse.syllablecount(bag)
+    subj = parse.syllablecount(bag) if 'syllablecount' in cands else None
     if subj:
 
         # Get syllables
@@ -716,7 +767,7 @@ def commands(bag):
         return say(resp, bag=bag)
 
     # Query - Returns response limited by a key phrase
-    match = parse.query(bag)
+    match = parse.query(bag) if 'query' in cands else None
     if match:
 
         # Query Facts
@@ -737,7 +788,7 @@ def commands(bag):
         return say(bag=bag, **resp)
 
     # Lookup
-    subj = parse.lookup(bag)
+    subj = parse.lookup(bag) if 'lookup' in cands else None
     if subj:
 
         # Lookup Facts
@@ -756,7 +807,7 @@ def commands(bag):
 
 
     # Literal
-    subj = parse.literal(bag)
+    subj = parse.literal(bag) if 'literal' in cands else None
     if subj:
         resp = literal(subj)
         if resp['code'] != code['success']:
@@ -765,7 +816,7 @@ def commands(bag):
 
 
     # What was that?
-    if parse.last(bag):
+    if 'last' in cands and parse.last(bag):
         resp = whatwasthat()
 
         # Failed
@@ -777,7 +828,7 @@ def commands(bag):
 
 
     # Edit - #[key] sub [new] => [old]
-    resp = parse.edit(bag)
+    resp = parse.edit(bag) if 'edit' in cands else None
     if resp:
         index = resp['index']
         new = resp['new']
@@ -788,7 +839,7 @@ def commands(bag):
         return say(bag=bag, **resp)
 
     # Delete
-    index = parse.delete(bag)
+    index = parse.delete(bag) if 'delete' in cands else None
     if index is not None:
 
         # Remove target
@@ -796,7 +847,7 @@ def commands(bag):
         return say(bag=bag, **resp)
 
     # Alias
-    match = parse.alias(bag)
+    match = parse.alias(bag) if 'alias' in cands else None
     if match:
 
         # Alias
@@ -805,7 +856,7 @@ def commands(bag):
 
 
     # Unalias - Admin Only
-    match = parse.unalias(bag)
+    match = parse.unalias(bag) if 'unalias' in cands else None
     if match:
 
         # Unalias
@@ -814,7 +865,7 @@ def commands(bag):
 
 
     # Merge - Admin only - Permanent
-    match = parse.merge(bag)
+    match = parse.merge(bag) if 'merge' in cands else None
     if match:
         
         # Merge
@@ -822,17 +873,17 @@ def commands(bag):
         return say(bag=bag, **resp)
 
     # Version
-    if parse.version(bag):
+    if 'version' in cands and parse.version(bag):
         log('Version Requested')
         return say('$who, I am version ' + version, bag=bag)
 
     # Status
-    if parse.stats(bag):
+    if 'stats' in cands and parse.stats(bag):
         log('Status requested')
         return say(status_string())
 
     # List users
-    if parse.listusers(bag):
+    if 'listusers' in cands and parse.listusers(bag):
 
         resp = userlist()
         if resp['code'] != code['success']:
@@ -840,7 +891,7 @@ def commands(bag):
         return say(bag=None, **resp)
 
     # List vars
-    match = parse.listvars(bag)
+    match = parse.listvars(bag) if 'listvars' in cands else None
     if match:
         
         # List vars
@@ -859,14 +910,14 @@ def commands(bag):
 
 
     # Iterate through a list
-    if parse.more(bag) and state['trace']:
+    if 'more' in cands and parse.more(bag) and state['trace']:
         if 'pages' in state['trace'].keys() and len(state['trace']['pages']) > 1:
             resp = iterate()
             return say(bag=None, **resp)
             
 
     # Change Config
-    match = parse.setconfig(bag)
+    match = parse.setconfig(bag) if 'setconfig' in cands else None
     if match:
 
         # Get key value
@@ -898,13 +949,13 @@ def commands(bag):
         return say(bag=bag, **resp)
 
     # Promote/Demote user
-    match = parse.promote(bag)
+    match = parse.promote(bag) if 'promote' in cands else None
     if match:
         resp = promote(match['mode'], match['user'], bag)
         return say(bag=bag, **resp)
 
     # Add Value
-    match = parse.addval(bag)
+    match = parse.addval(bag) if 'addval' in cands else None
     if match:
 
         # Add value
@@ -913,18 +964,18 @@ def commands(bag):
             return say(bag=bag, **resp)
 
     # Remove var - Op only
-    match = parse.remvar(bag)
+    match = parse.remvar(bag) if 'remvar' in cands else None
     if match:
         resp = remvar(match, bag)
         return say(bag=bag, **resp)                
 
     # Undo Last
-    if parse.undo(bag):
+    if 'undo' in cands and parse.undo(bag):
         resp = undo(bag)
         return say(bag=bag, **resp)
 
     # Refresh All Caches
-    if parse.refresh(bag):
+    if 'refresh' in cands and parse.refresh(bag):
         resp = refresh(bag)
         return say(bag=bag, **resp)
 
@@ -1104,87 +1155,171 @@ def core(bag):
 
 
 # Process Plugins
+# Plugins run on the pool and their results are handled in plugin order
+# Each plugin gets plugin_timeout seconds once started and all of them share
+# the plugin_budget, plugins still running after that are left behind
 def plugins(bag):
 
-    response = []
-    for mod in mods:
+    # Trigger Probability
+    selected = [x for x in registry.select(bag) if random.randint(0, 100) <= config[x]]
 
-        # Trigger Probability
-        if random.randint(0, 100) <= config[mod]:
+    # Skip plugins still stuck on an earlier call, and everything if they fill the pool
+    with straggling:
+        if sum(stragglers.values()) >= config['plugin_workers']:
+            log('Plugin pool saturated by timed out calls - skipping plugins')
+            return []
+        selected = [x for x in selected if not stragglers.get(x)]
 
-            try:
-                result = eval(mod + ".main(bag, config)")
+    # Import plugins before their timeouts start - a first import can be slow
+    ready = []
+    for mod in selected:
+        stats.plugin(mod, 'calls')
+        try:
+            registry.module(mod)
+            ready.append(mod)
+        except:
+            if plugin_error(mod):
+                raise
+    selected = ready
+
+    # Start Plugins
+    started = {}
+    deadline = time.time() + config['plugin_budget']
+    calls = []
+    for mod in selected:
+        calls.append((mod, pool.submit(run_plugin, mod, bag, groups.current(), started)))
 
-                # Function Call
-                if type(result) == dict:
-                    if 'call' in result.keys():
+    response = []
+    for mod, call in calls:
 
-                        # Get Tweets
-                        if result['call'] == 'twitter':
-                            tweets = gettweets(result['username'])
-                            result = eval(mod + ".recall(bag, config, tweets)")
+        # Wait for Plugin
+        try:
+            wait = min(started.get(mod, time.time()) + config['plugin_timeout'], deadline) - time.time()
+            result = call.result(timeout=max(wait, 0))
 
-                        # Get Vars
-                        elif result['call'] == 'getvar':
-                            values = getvalues(result['var'])
-                            result = eval(mod + ".recall(bag, config, values)")
-            
-            # Catch Plugin Errors
-            except:
-                if config['offline']:
+        # Timed Out - unless the plugin raised the timeout itself
+        except concurrent.futures.TimeoutError as err:
+            if call.done() and call.exception() is err:
+                if plugin_error(mod):
                     raise
-                else:
-                    log('Plugin "' + mod + '" encountered an error -', sys.exc_info()[0])
-                    continue
+                continue
+
+            if not call.cancel():
+                abandon(mod, call)
+            stats.plugin(mod, 'timeouts')
+            log('Plugin "' + mod + '" timed out')
+            continue
+
+        # Catch Plugin Errors
+        except:
+            if plugin_error(mod):
+                raise
+            continue
 
-            # Dictionary
-            if type(result) == dict:
-                keys = result.keys()
-
-                # Learn Value
-                if 'addval' in keys:
-                    resp = addvalue(result['addval']['var'], result['addval']['val'], bag)
-                    if resp['code'] == code['success'] and 'success' in result['addval'].keys():
-                        response.append({ 'response' : result['addval']['success'], 'last' : resp['last'] })
-                    elif resp['code'] == code['success']:
-                        result['last'] = resp['last']
-
-                # Learn Fact
-                if 'learn' in keys:
-                    resp = new_fact(result['learn']['subj'], result['learn']['mode'], result['learn']['fact'], bag)
-                    if resp['code'] == code['success'] and 'success' in result['learn'].keys():
-                        response.append({ 'response' : result['learn']['success'], 'last' : resp['last'] })
-                    elif resp['code'] == code['success']:
-                        result['last'] = resp['last']
-
-                # Lookup
-                if 'lookup' in keys:
-                    resp = fact_query(result['lookup'])
-                    if resp['code'] == code['success']:
-                        for x in resp['result']:
-                            response.append( compile_fact(**x) )
-
-                # Response
-                if 'msg' in keys:
-                    resp = { 'response' : result['msg'] }
-                    if 'last' in keys:
-                        resp['last'] = result['last']
-                    response.append(resp)
-
-            # String
-            if type(result) is str:
-                response.append({ 'response' : result })
-
-            # List
-            elif type(result) is list:
-                for x in result:
-                    if type(x) is str:
-                        x = { 'response' : x }
-                    response.append(x)
+        # Count responses
+        if result:
+            stats.plugin(mod, 'responses')
+
+        # Dictionary
+        if type(result) == dict:
+            keys = result.keys()
+
+            # Learn Value
+            if 'addval' in keys:
+                resp = addvalue(result['addval']['var'], result['addval']['val'], bag)
+                if resp['code'] == code['success'] and 'success' in result['addval'].keys():
+                    response.append({ 'response' : result['addval']['success'], 'last' : resp['last'] })
+                elif resp['code'] == code['success']:
+                    result['last'] = resp['last']
+
+            # Learn Fact
+            if 'learn' in keys:
+                resp = new_fact(result['learn']['subj'], result['learn']['mode'], result['learn']['fact'], bag)
+                if resp['code'] == code['success'] and 'success' in result['learn'].keys():
+                    response.append({ 'response' : result['learn']['success'], 'last' : resp['last'] })
+                elif resp['code'] == code['success']:
+                    result['last'] = resp['last']
+
+            # Lookup
+            if 'lookup' in keys:
+                resp = fact_query(result['lookup'])
+                if resp['code'] == code['success']:
+                    for x in resp['result']:
+                        response.append( compile_fact(**x) )
+
+            # Response
+            if 'msg' in keys:
+                resp = { 'response' : result['msg'] }
+                if 'last' in keys:
+                    resp['last'] = result['last']
+                response.append(resp)
+
+        # String
+        if type(result) is str:
+            response.append({ 'response' : result })
+
+        # List
+        elif type(result) is list:
+            for x in result:
+                if type(x) is str:
+                    x = { 'response' : x }
+                response.append(x)
 
     return response
 
 
+# Counts the plugin error being handled
+# Returns True if it should be raised
+def plugin_error(mod):
+
+    stats.plugin(mod, 'errors')
+    if config['offline']:
+        return True
+
+    log('Plugin "' + mod + '" encountered an error -', sys.exc_info()[0])
+    return False
+
+
+# Counts a timed out call as a straggler until it returns
+def abandon(mod, call):
+
+    def done(call):
+        with straggling:
+            stragglers[mod] -= 1
+            if not stragglers[mod]:
+                del stragglers[mod]
+
+    with straggling:
+        stragglers[mod] = stragglers.get(mod, 0) + 1
+    call.add_done_callback(done)
+
+
+# Runs a plugin on the pool for the caller's group
+def run_plugin(mod, bag, group, started):
+
+    started[mod] = time.time()
+    groups.select(group)
+    plugin = registry.module(mod)
+
+    result = plugin.main(bag, config)
+
+    # Function Call
+    if type(result) == dict:
+        if 'call' in result.keys():
+
+            # Get Tweets
+            if result['call'] == 'twitter':
+                tweets = gettweets(result['username'])
+                result = plugin.recall(bag, config, tweets)
+
+            # Get Vars
+            elif result['call'] == 'getvar':
+                values = getvalues(result['var'])
+                result = plugin.recall(bag, config, values)
+
+    return result
+
+
 # Process an X is Y command
 def xisy(subject, mode, factoid, bag):
 
@@ -1363,9 +1498,6 @@ def addvalue(var, value, bag):
     # Success
     log("Added new value " + sq(value) + " to var " + sq(var))
 
-    # update cache
-    update_vars(varid=resp['result'][0]['id'], var=var, val=value, protected=protected)
-
     # Response
     last = { 'id' : [resp['result'][0]['id']], 'source' : source['varlist'] }
     return { 'code' : code['success'], 'response' : "Okay, $who, learned new " + var + " " + sq(value), 'last' : last }
@@ -1395,7 +1527,6 @@ def remvalue(docid, bag):
             delete=False, 
             response="Okay $who, un-forgot " + var + " " + sq(value),
             command='cache_vars')
-    update_vars()
     return { 'code' : code['success'], 'response' : "Okay, $who, forgot " + var + " '" + value + "'" }
 
 
@@ -1439,7 +1570,6 @@ def remvar(var, bag):
             delete=False,
             response="Okay $who, un-forgot var " + sq(var),
             command='cache_vars')
-    update_vars()
     return { 'code' : code['success'], 'response' : "Okay, $who, removed var " + sq(var) }
 
 
@@ -1478,6 +1608,10 @@ def fact_count():
     if resp['code'] != code['success']:
         return resp
 
+    # Empty database - no reduce rows
+    if not len(resp['result']):
+        return 0
+
     # Return count
     return resp['result'][0]['value']
 
@@ -1495,11 +1629,21 @@ def subj_count():
 
 
 # Returns a random response from various sources
-# Excludes cached factoids 
-def random_fact(include_cached=False):
+# Includes cached factoids, as the nonalias view does
+# include_cached=False excludes them when the factoid index is loaded
+def random_fact(include_cached=True):
+
+    # Indexed Sample
+    if factoids.loaded:
+        result = factoids.sample(include_cached)
+        if result is None:
+            return cached(code=code['missing'])
+        return compile_fact(**result)
 
     # Select Fact
     count = fact_count()
+    if count == 0:
+        return cached(code=code['missing'])
     choice = random.randint(0, count - 1)
     resp = brickdb.query('nonalias', fulldocs=True, limit=1, skip=choice)
 
@@ -1890,9 +2034,6 @@ def add_syllables(subj, syll, bag):
                 command='cache_syllables')
         log("'" + subj + "'", 'updated')
 
-
-    update_syllables()
-
     log('Learned that', "'" + subj + "'", 'has', str(syll), 'syllables')
     return { 'code' : code['success'], 'response' : "Okay, $who" }
 
@@ -1905,20 +2046,20 @@ def update_user(userid, name=None):
     if name:
         users[userid]['name'] = name
 
+    # Existing users - written behind in batches
+    if '_id' in users[userid].keys():
+        activity.record(bot.groupid, userid, name, users[userid]['last'])
+        return { 'code' : code['success'] }
+
     # Generate doc
     doc = users[userid].copy()
     doc['subject'] = doc['name']
     doc['subject_lc'] = doc['name'].lower()
     doc.pop('name', None)
 
-    # Update
-    log("Updating User " + sq(name) + "...")
-    if '_id' in users[userid].keys():
-        resp = brickdb.update_docs(doc, undo=False)
-
     # New
-    else:
-        resp = brickdb.post_docs(doc)
+    log("Adding User " + sq(name) + "...")
+    resp = brickdb.post_docs(doc)
 
     result = resp['result'][0]
 
@@ -1929,6 +2070,7 @@ def update_user(userid, name=None):
         return update_user(userid, name)
 
     # Success
+    users[userid]['_id'] = resp['result'][0]['id']
     users[userid]['_rev'] = resp['result'][0]['rev']
     return resp
 
@@ -1989,9 +2131,6 @@ def change_role(user, role, bag):
     resp = brickdb.update_docs({ '_id' : users[user]['_id'], 'role' : role })
     if resp['code'] == code['success']:
         log("User " + sq(users[user]['name']) + " updated")
-
-        # Update users
-        update_users()
         return { 'code' : code['success'], 'response' : "Okay, $who" }
 
     # Failed
@@ -2022,7 +2161,6 @@ def remuser(userid, bag):
             delete=False,
             response="Okay $who, user " + sq(resp['old'][0]['subject']) + " unforgot.",
             command='cache_users')
-    update_users()
     return { 'code' : code['success'], 'response' : "Okay, $who, forgot user '" + resp['old'][0]['subject'] + "'" }
 
 
@@ -2138,9 +2276,6 @@ def protect_var(mode, var, bag):
             response=response,
             command='cache_vars')
 
-    # Update Cache
-    update_vars()
-
     # Post Results
     log(len(update), 'vars updated')
     if mode:
@@ -2203,9 +2338,6 @@ def tag_facts(key, bag, cache_mode=None, protect_mode=None):
             response=" Okay $who, factoids reverted.",
             command='cache_facts')
 
-    # Update Cache
-    update_cache()
-
     # Post Results
     log(len(update), 'factoids updated')
     return { 'code' : code['success'], 'response' : "Okay, $who" }
@@ -2458,10 +2590,6 @@ def new_fact(subj, mode, fact, bag):
     if resp['code'] != code['success']:
         return resp
 
-    # Update Cache
-    if iscached:
-        update_cache()
-
     # Set Undo
     setundo (user=bag['user_id'], 
             docs=payload,
@@ -2498,6 +2626,33 @@ def get_vars(var=None, fulldocs=False):
 # Return facts for a given subject - follows aliases
 def fact_query(txt, alias=True, properties=False):
 
+    # Indexed Lookup
+    if factoids.loaded:
+        result = factoids.lookup(txt, alias)
+        if result is None:
+            return cached(code=code['missing'])
+
+    # Query Database
+    else:
+        resp = fact_fetch(txt, alias)
+        if resp['code'] != code['success']:
+            return resp
+        result = resp['result']
+
+    response = { 'code' : code['success'], 'response' : "Okay, $who", 'result' : result }
+
+    # Get Properties
+    if properties:
+        prop = common(response['result'])
+        if prop['code'] != code['success']:
+            return prop
+        response['properties'] = prop['result']
+    
+    return response
+
+# Return facts for a given subject from the database - follows aliases
+def fact_fetch(txt, alias=True):
+
     # Query Database
     resp = brickdb.query('subjects', txt, fulldocs=True)
 
@@ -2517,7 +2672,7 @@ def fact_query(txt, alias=True, properties=False):
             # Recursive Query
             if doc['mode'] == '<alias>':
                 log('<alias>', "'" + txt + "'", '=>', "'" + doc['factoid'] + "'")
-                sub_facts = fact_query(doc['factoid'])
+                sub_facts = fact_fetch(doc['factoid'])
                 if sub_facts['code'] != code['success']:
                     return sub_facts
                 result += sub_facts['result']
@@ -2530,16 +2685,7 @@ def fact_query(txt, alias=True, properties=False):
     else:
         result = resp['result']
 
-    response = { 'code' : code['success'], 'response' : "Okay, $who", 'result' : result }
-
-    # Get Properties
-    if properties:
-        prop = common(response['result'])
-        if prop['code'] != code['success']:
-            return prop
-        response['properties'] = prop['result']
-    
-    return response
+    return { 'code' : code['success'], 'result' : result }
 
 # Returns facts for a given subject and a key phrase
 def query(subj, key):
@@ -2686,7 +2832,6 @@ def page(rows, size=None):
 # Updates user cache
 # Terminates on failed query
 def update_users():
-    global users
 
     # Query database
     resp = brickdb.query('users', key=bot.groupid, fulldocs=True)
@@ -2698,14 +2843,18 @@ def update_users():
         return resp
 
     # Process Result
-    users = {}
+    result = {}
     for row in resp['result']:
 
-        users[row['user_id']] = row
+        result[row['user_id']] = row
 
         # Duplicate entries for legacy support
-        name = users[row['user_id']]['subject']
-        users[row['user_id']]['name'] = name
+        name = result[row['user_id']]['subject']
+        result[row['user_id']]['name'] = name
+
+    # Swap cache
+    with groups.lock():
+        groups.put('users', result)
 
     updated = len(users.keys())
 
@@ -2861,7 +3010,7 @@ def cached(subj="[don't know]", code=None):
 
 # Loads configuration keys
 def initialize():
-    global bot
+    global pool
 
     # Load Configuration
     settings.load_config()
@@ -2876,52 +3025,94 @@ def initialize():
     if config['db_name'] is None:
         log('No database name provided.  Using botname instead.')
         config['db_name'] = config['botname']
-    if config['db_key'] is None:
-        sys.exit("Database API key not specified - Set config var 'db_key'")
-    if config['db_pass'] is None:
-        sys.exit("Database API password not specified - Set config var 'db_pass'")
-    if config['db_user'] is None:
-        sys.exit("Database username not specified - Set config var 'db_user'")
+    if config['db_backend'] not in ('cloudant', 'sqlite'):
+        sys.exit("Unknown database backend " + repr(config['db_backend']) + " - Set config var 'db_backend' to 'cloudant' or 'sqlite'")
+    if config['db_backend'] == 'cloudant':
+        if config['db_key'] is None:
+            sys.exit("Database API key not specified - Set config var 'db_key'")
+        if config['db_pass'] is None:
+            sys.exit("Database API password not specified - Set config var 'db_pass'")
+        if config['db_user'] is None:
+            sys.exit("Database username not specified - Set config var 'db_user'")
+
+    # Configure HTTP Transport
+    transport.configure(config)
+
+    # Get Bot Info - one bot per group in multigroup mode
+    if config['multigroup']:
+        bots = groupme.bots(config['groupme_token'], config['botname'], http, config['baseurl'])
+    else:
+        bots = [groupme.bot(config['groupme_token'], config['botname'], http, config['baseurl'])]
 
-    # Get Bot Info
-    bot = groupme.bot(config['groupme_token'], config['botname'], http, config['baseurl'])
+    # Register Groups
+    groups.reset()
+    for x in bots:
+        groups.add(x)
 
     # Initialize Database
     resp = brickdb.initialize(http)
     if resp['code'] == code['success']:
         config['db_url'] = resp['url']
+    seq = resp.get('seq')
+
+    # Apply writes and changes to the local caches
+    if apply_docs not in brickdb.listeners:
+        brickdb.listeners.append(apply_docs)
+    if stats.apply not in brickdb.listeners:
+        brickdb.listeners.append(stats.apply)
+
+    # Load Factoid Index
+    if config['fact_index']:
+        if factoids.apply not in brickdb.listeners:
+            brickdb.listeners.append(factoids.apply)
+        factoids.load()
 
     # Load Cache
     if config['caching']:
         update_cache()
 
-    # Load User Data
-    update_users()
-
     # Load Syllable Cache
     update_syllables()
 
+    # Load Syllable Dictionary in the background
+    threading.Thread(target=syllables.load, daemon=True).start()
+
     # Load Vars
     if config['caching']:
         update_vars()
 
+    # Statistics
+    stats.reconcile(force=True)
+
     # Connect Twitter
     init_twitter()
 
     # Plugins
     settings.load_mods(mods)
+    registry.build(mods, strict=config['offline'] or config['devmode'])
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=config['plugin_workers'])
 
-    # Load State
-    loadState()
+    # Load User Data and State for each group
+    for group in groups.each():
+        update_users()
+        loadState()
+
+        if config['debug']:
+            jprint(groups.get('state'))
+
+    # Save user activity in batches
+    activity.start(config['user_flush'])
+
+    # Follow changes made since the caches were loaded
+    # The local database is only written by this process
+    if config['follow_changes'] and config['db_backend'] == 'cloudant':
+        changes.start(seq)
 
     if config['debug']:
-        jprint(state)
         jprint(config)
 
 # Fetches or generates previous state
 def loadState():
-    global state
-    global config
 
     # Fetch State
     resp = brickdb.query('states', fulldocs=True)
@@ -2941,11 +3132,23 @@ def loadState():
         s = newState()
         updateState(newstate=s)
 
-    state = s
+    groups.put('state', s)
     if 'config' in state.keys():
-        config = s['config']
+
+        # Config is shared by all groups - the primary group's stored config applies
+        if groups.current() == groups.primary:
+            config.update(s['config'])
+        s['config'] = config
+
+        # Fill keys left out of the stored config
+        for key in list(defaults.keys()) + mods:
+            if key not in config.keys():
+                config[key] = loaded(key)
     log("State loaded.")
 
+    # Stored copy is current
+    groups.put('persisted', { 'digests' : digest(compact(s)), 'time' : time.time() })
+
     # Debug
     if config['debug']:
         util.debug('state ID: ' + state['_id'])
@@ -2961,6 +3164,9 @@ def selectState(s):
     # Valid modes contain a config file with matching 'offline' and 'botname' settings
     s = [x for x in s if 'config' in x.keys() and x['config']['offline'] == config['offline'] and x['config']['botname'] == config['botname']]
 
+    # Eliminate other groups - states without a group belong to the first group
+    s = [x for x in s if x.get('group', groups.primary) == bot.groupid]
+
     # Eliminate invalid versions
     old = [x['_id'] for x in s]
     s = [x for x in s if x['version'] == version]
@@ -2988,6 +3194,7 @@ def newState():
 
     state = {
         'config'       : config,
+        'group'        : bot.groupid,
         'version'      : version,
         'uptime'       : time.time(),
         'undo'         : {},
@@ -3007,40 +3214,88 @@ def newState():
     
 
 # Updates existing state
-def updateState(newstate=None):
-    global state
+# Only writes when a field changed, at most once per state_debounce seconds
+# unless forced
+def updateState(newstate=None, force=False):
 
     # New State
     if newstate is not None:
-        state = newstate
+        groups.put('state', newstate)
+        force = True
 
-    payload = state
+    payload = groups.get('state')
     payload['config']  = config
     payload['version'] = version
-    payload['state']   = time.time()
+
+    # Compare with the stored copy
+    doc = compact(payload)
+    digests = digest(doc)
+    persisted = groups.get('persisted')
+    if digests == persisted['digests']:
+        return
+
+    # Debounce - changes are kept for the next update
+    if not force and time.time() - persisted['time'] < config['state_debounce']:
+        return
 
     # Post state
-    resp = brickdb.post_docs(payload)
-    if resp['code'] == code['success']:
+    doc['state'] = time.time()
+    resp = brickdb.post_docs(doc)
+    if resp['code'] == code['success'] and resp['result'][0]['code'] == code['success']:
         state['_id'] = resp['result'][0]['id']
         state['_rev'] = resp['result'][0]['rev']
+        state['state'] = doc['state']
+        groups.put('persisted', { 'digests' : digests, 'time' : time.time() })
         log("State updated.")
     else:
         log("State update failed!")
 
     return 
 
+
+# Returns the value a config key has when nothing is stored
+def loaded(key):
+    val = settings.load(key)
+    if val is None and key in mods:
+        val = 100
+    return val
+
+
+# Returns a copy of a state to store
+# Config only keeps keys that differ from the loaded values
+def compact(s):
+
+    doc = dict(s)
+    if 'config' in doc.keys():
+        doc['config'] = dict([ (x, y) for x, y in doc['config'].items() if x in ('offline', 'botname') or y != loaded(x) ])
+
+    return doc
+
+
+# Returns digests of the stored fields of a state
+def digest(s):
+
+    result = {}
+    for key in s.keys():
+        if key not in ('_id', '_rev', 'state'):
+            text = json.dumps(s[key], sort_keys=True, default=str)
+            result[key] = hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    return result
+
 # Update vars from database
 def update_vars(varid=None, val=None, var=None, protected=0):
-    global var_cache
+    global var_cache, var_ids
 
     # Update with provided value
     if varid and val and var:
         newvar = {'id':varid, 'val':val, 'protected' : protected}
-        if var in var_cache.keys():
-            var_cache[var].append(newvar)
-        else:
-            var_cache[var] = [newvar]
+        with lock:
+            if var in var_cache.keys():
+                var_cache[var].append(newvar)
+            else:
+                var_cache[var] = [newvar]
+            var_ids[varid] = var
         log('var cache updated.')
         return { 'code' : code['success'] }
 
@@ -3048,16 +3303,23 @@ def update_vars(varid=None, val=None, var=None, protected=0):
     log('Updating cache...')
     resp = get_vars(fulldocs=True)
 
-    # Clear cache
-    var_cache = {}
+    # Build cache
+    result = {}
+    ids = {}
     
     # Cache vars
     resp = resp['result']
     for row in resp:
-        if row['var'] in var_cache.keys():
-            var_cache[row['var']].append({'val':row['value'], 'id':row['_id'], 'protected':row['protected']})
+        if row['var'] in result.keys():
+            result[row['var']].append({'val':row['value'], 'id':row['_id'], 'protected':row['protected']})
         else:
-            var_cache[row['var']] = [{'val':row['value'], 'id':row['_id'], 'protected':row['protected']}]
+            result[row['var']] = [{'val':row['value'], 'id':row['_id'], 'protected':row['protected']}]
+        ids[row['_id']] = row['var']
+
+    # Swap cache
+    with lock:
+        var_cache = result
+        var_ids = ids
 
     log(len(resp), 'values cached for', len(var_cache.keys()), 'vars')
     return { 'code' : code['success'] }
@@ -3065,9 +3327,7 @@ def update_vars(varid=None, val=None, var=None, protected=0):
 
 # Update Syllable Cache from database
 def update_syllables():
-
-    # Clear cache
-    syllables.syllcache = {}
+    global syllable_ids
 
     # Get syllables
     resp = brickdb.query('syllables')
@@ -3080,8 +3340,16 @@ def update_syllables():
     resp = resp['result']
     
     # Cache syllables
+    result = {}
+    ids = {}
     for row in resp:
-        syllables.syllcache[row['key']] = row['value']
+        result[row['key']] = row['value']
+        ids[row['id']] = row['key']
+
+    # Swap cache
+    with lock:
+        syllables.syllcache = result
+        syllable_ids = ids
 
     log('syllable cache updated with', len(resp), 'words')
     return { 'code' : code['success'] }
@@ -3089,10 +3357,7 @@ def update_syllables():
 
 # Clears and reloads the factoid cache
 def update_cache():
-    global cache
-
-    # Clear cache
-    cache = {}
+    global cache, cache_ids
 
     # Get factoids
     resp = brickdb.query('cached')
@@ -3105,16 +3370,139 @@ def update_cache():
     resp = resp['result']
     
     # Cache factoids
+    result = {}
+    ids = {}
     for row in resp:
-        if row['key'] in cache.keys():
-            cache[row['key']].append({ 'id' : row['id'], 'value' : row['value'] })
+        if row['key'] in result.keys():
+            result[row['key']].append({ 'id' : row['id'], 'value' : row['value'] })
         else:
-            cache[row['key']] = [{ 'id' : row['id'], 'value' : row['value'] }]
+            result[row['key']] = [{ 'id' : row['id'], 'value' : row['value'] }]
+        ids[row['id']] = row['key']
+
+    # Swap cache
+    with lock:
+        cache = result
+        cache_ids = ids
 
     log(len(resp), 'factoids cached for', len(cache.keys()), 'subjects')
     return { 'code' : code['success'] }
 
 
+# Applies written or changed docs to the local caches
+# Docs are matched by ID, so repeated deltas are harmless
+# Revisions older than the last one applied are ignored
+def apply_docs(docs):
+    global cache, var_cache
+
+    with lock:
+
+        # Copy caches - readers keep a consistent view
+        newcache = dict(cache)
+        newvars = dict(var_cache)
+        words = dict(syllables.syllcache)
+
+        for doc in docs:
+            docid = doc.get('_id')
+            if docid is None:
+                continue
+
+            # Stale revision
+            rev = util.revision(doc)
+            if rev:
+                if rev < doc_revs.get(docid, 0):
+                    continue
+                doc_revs[docid] = rev
+
+            # Remove previous versions
+            subj = cache_ids.pop(docid, None)
+            if subj is not None:
+                newcache[subj] = [x for x in newcache.get(subj, []) if x['id'] != docid]
+                if not len(newcache[subj]):
+                    del newcache[subj]
+            var = var_ids.pop(docid, None)
+            if var is not None:
+                newvars[var] = [x for x in newvars.get(var, []) if x['id'] != docid]
+                if not len(newvars[var]):
+                    del newvars[var]
+            word = syllable_ids.pop(docid, None)
+            if word is not None:
+                words.pop(word, None)
+
+            # Deleted
+            if doc.get('_deleted'):
+                continue
+
+            # Cached factoid
+            if factoids.isfact(doc):
+                if config['caching'] and doc.get('cached') and doc['mode'] != '<alias>':
+                    subj = doc['subject_lc']
+                    newcache[subj] = newcache.get(subj, []) + [{ 'id' : docid, 'value' : compile_fact(**doc)['response'] }]
+                    cache_ids[docid] = subj
+
+            # Var value
+            elif 'var' in doc and 'value' in doc:
+                if config['caching']:
+                    newvars[doc['var']] = newvars.get(doc['var'], []) + [{ 'val' : doc['value'], 'id' : docid, 'protected' : doc.get('protected', 0) }]
+                    var_ids[docid] = doc['var']
+
+            # Syllables
+            elif 'syllables' in doc and 'subject' in doc:
+                words[doc['subject']] = doc['syllables']
+                syllable_ids[docid] = doc['subject']
+
+        # Swap caches
+        cache = newcache
+        var_cache = newvars
+        syllables.syllcache = words
+
+    # Users - outside the cache lock, group locks are taken first elsewhere
+    apply_users(docs)
+
+
+# Applies written or changed user docs to each group's users
+def apply_users(docs):
+
+    for doc in docs:
+
+        # Owning group - deletions from the change feed only carry an ID
+        if 'group' in doc:
+            targets = [doc['group']]
+        elif doc.get('_deleted'):
+            targets = list(groups.shards.keys())
+        else:
+            continue
+
+        for group in targets:
+            if group not in groups.shards:
+                continue
+
+            with groups.lock(group):
+                members = groups.get('users', group)
+
+                # Deleted
+                if doc.get('_deleted'):
+                    for x in [x for x in members.keys() if members[x].get('_id') == doc['_id']]:
+                        del members[x]
+                    continue
+
+                # Not a user
+                if 'user_id' not in doc or 'subject' not in doc:
+                    continue
+
+                # Already current
+                current = members.get(doc['user_id'], {})
+                if util.revision(current) >= util.revision(doc):
+                    continue
+
+                # Activity still buffered is newer than any stored revision
+                member = dict(doc)
+                entry = activity.buffered(group, doc['user_id'])
+                if entry is not None:
+                    member.update(activity.fields(entry))
+                member['name'] = member['subject']
+                members[doc['user_id']] = member
+
+
 # Loads and authenticates a twitter API object
 def init_twitter():
     global t
@@ -3234,7 +3622,7 @@ def setkey(key, val=None):
     log('Configuration Updated:', repr(key), " => ", repr(val))
 
     # Save State
-    updateState()
+    updateState(force=True)
 
     return { 'code' : code['success'], 'response' : "Okay $who, configuration updated." }
 
@@ -3262,16 +3650,6 @@ def undo(bag):
     if resp['code'] != code['success']:
         return resp
 
-    # Commands
-    if last['command'] == 'cache_vars':
-        update_vars()
-    if last['command'] == 'cache_syllables':
-        update_syllables()
-    if last['command'] == 'cache_users':
-        update_users()
-    if last['command'] == 'cache_facts':
-        update_cache()
-
     # Success
     setundo()
     return { 'code' : code['success'], 'response' : last['response'] }
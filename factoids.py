@@ -0,0 +1,281 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# In-memory factoid index
+# Facts are keyed by subject_lc with alias chains resolved ahead of time,
+# so a lookup for an unknown subject costs a dict lookup instead of a query
+# Kept current as a brickdb listener
+# Also keeps pools of non-alias fact IDs for constant time random sampling
+
+import random
+import threading
+import brickdb
+import util
+from settings import code
+from util import log
+
+# subject_lc => [ fact docs ]
+index = {}
+# subject_lc => [ fact docs with aliases followed ] or None
+resolved = {}
+# doc id => subject_lc
+subjects = {}
+# alias target => set of subjects aliased to it
+referrers = {}
+# cached => [ non-alias fact IDs ]
+pools = { False : [], True : [] }
+# doc id => (cached, position in pool)
+positions = {}
+# subject_lc => number of non-alias facts
+counts = {}
+# doc id => revision generation last applied
+revs = {}
+
+loaded = False
+lock = threading.RLock()
+
+
+# Returns True for factoid documents
+def isfact(doc):
+    return type(doc) is dict and 'subject_lc' in doc and 'mode' in doc and 'factoid' in doc
+
+
+# Bulk loads all factoids
+def load():
+    global loaded
+
+    log('Loading factoid index...')
+    resp = brickdb.view('main', 'subjects', include_docs=True)
+
+    # Failure - lookups fall back to the database
+    if resp['code'] != code['success']:
+        log('Factoid index load failed!')
+        with lock:
+            loaded = False
+        return resp
+
+    with lock:
+        index.clear()
+        resolved.clear()
+        subjects.clear()
+        referrers.clear()
+        positions.clear()
+        counts.clear()
+        revs.clear()
+        for pool in pools.values():
+            del pool[:]
+
+        for doc in resp['result']:
+            if isfact(doc):
+                insert(doc)
+                revs[doc['_id']] = util.revision(doc)
+
+        # Resolve aliases
+        for subj in list(index.keys()):
+            resolve(subj)
+
+        loaded = True
+
+    log(len(subjects), 'factoids indexed for', len(index.keys()), 'subjects')
+    return { 'code' : code['success'] }
+
+
+# Returns copies of the facts for a subject
+# Returns None if the subject or an alias target is unknown
+def lookup(txt, alias=True):
+
+    subj = util.depunctuate(txt)
+    with lock:
+        if alias:
+            result = resolved.get(subj)
+        else:
+            result = index.get(subj)
+
+        if not result:
+            return None
+
+        return [ dict(x) for x in result ]
+
+
+# Returns the number of non-alias facts and subjects with them
+def totals():
+    with lock:
+        return (len(positions), len(counts))
+
+
+# Returns a copy of a uniformly chosen non-alias fact
+# Returns None if there are no facts
+def sample(include_cached=True):
+
+    with lock:
+        plain = pools[False]
+        count = len(plain)
+        if include_cached:
+            count += len(pools[True])
+
+        if not count:
+            return None
+
+        # Pick across both pools
+        choice = random.randrange(count)
+        if choice < len(plain):
+            docid = plain[choice]
+        else:
+            docid = pools[True][choice - len(plain)]
+
+        for doc in index[subjects[docid]]:
+            if doc['_id'] == docid:
+                return dict(doc)
+
+
+# Adds, replaces or removes docs in the index
+def apply(docs):
+
+    if not loaded:
+        return
+
+    with lock:
+        changed = set()
+        for doc in docs:
+            docid = doc.get('_id')
+
+            # Stale revision
+            rev = util.revision(doc)
+            if rev:
+                if rev < revs.get(docid, 0):
+                    continue
+                revs[docid] = rev
+
+            # Remove previous version
+            subj = subjects.get(docid)
+            if subj is not None:
+                discard(docid)
+                changed.add(subj)
+
+            # Deleted or not a factoid
+            if doc.get('_deleted') or not isfact(doc):
+                continue
+
+            insert(dict(doc))
+            changed.add(doc['subject_lc'])
+
+        refresh(changed)
+
+
+# Adds a doc to the index
+def insert(doc):
+
+    subj = doc['subject_lc']
+    docs = index.setdefault(subj, [])
+    docs.append(doc)
+    docs.sort(key=lambda x: x.get('_id', ''))
+    subjects[doc['_id']] = subj
+
+    if doc['mode'] == '<alias>':
+        referrers.setdefault(util.depunctuate(doc['factoid']), set()).add(subj)
+
+    # Sampling pool
+    else:
+        pool = pools[bool(doc.get('cached'))]
+        positions[doc['_id']] = (bool(doc.get('cached')), len(pool))
+        pool.append(doc['_id'])
+        counts[subj] = counts.get(subj, 0) + 1
+
+
+# Removes a doc from the index
+def discard(docid):
+
+    subj = subjects.pop(docid)
+    docs = [x for x in index.get(subj, []) if x['_id'] != docid]
+
+    # Sampling pool - move the last ID into the gap
+    if docid in positions:
+        cached, position = positions.pop(docid)
+        pool = pools[cached]
+        moved = pool.pop()
+        if moved != docid:
+            pool[position] = moved
+            positions[moved] = (cached, position)
+
+        counts[subj] -= 1
+        if not counts[subj]:
+            del counts[subj]
+    if len(docs):
+        index[subj] = docs
+    else:
+        index.pop(subj, None)
+
+    # Drop alias links no longer present
+    aliased = set([util.depunctuate(x['factoid']) for x in docs if x['mode'] == '<alias>'])
+    for target in list(referrers.keys()):
+        if subj in referrers[target] and target not in aliased:
+            referrers[target].discard(subj)
+            if not len(referrers[target]):
+                del referrers[target]
+
+
+# Re-resolves changed subjects and every subject aliased to them
+def refresh(changed):
+
+    # Collect dependents
+    stale = set()
+    pending = list(changed)
+    while len(pending):
+        subj = pending.pop()
+        if subj in stale:
+            continue
+        stale.add(subj)
+        pending += list(referrers.get(subj, ()))
+
+    for subj in stale:
+        resolved.pop(subj, None)
+
+    for subj in stale:
+        if subj in index:
+            resolve(subj)
+
+
+# Follows alias links for a subject
+def resolve(subj, seen=()):
+
+    if subj in resolved:
+        return resolved[subj]
+
+    # Alias loop
+    if subj in seen:
+        log('Alias loop found for', repr(subj))
+        return None
+
+    docs = index.get(subj)
+    if not docs:
+        return None
+
+    result = []
+    for doc in docs:
+        if doc['mode'] == '<alias>':
+            sub = resolve(util.depunctuate(doc['factoid']), seen + (subj,))
+            if sub is None:
+                result = None
+                break
+            result += sub
+        else:
+            result.append(doc)
+
+    resolved[subj] = result
+    return result
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Brick.  If not, see <http://www.gnu.org/licenses/>.
 
+import sys
 from time import sleep
 import settings
 import requests
@@ -25,18 +26,29 @@ class bot:
 
     http = None
 
-    def __init__(self, token, name, interface, baseurl='https://api.groupme.com/v3'):
+    def __init__(self, token, name, interface, baseurl='https://api.groupme.com/v3', info=None):
         self.token = token
         self.name = name
         self.baseurl = baseurl
         self.http = interface
-        self.get_botinfo()
+
+        # Use known bot info
+        if info is not None:
+            self.load_botinfo(info)
+        else:
+            self.get_botinfo()
 
     def post(self, msg):
-        resp = self.http.post(self.baseurl + '/bots/post', data={
-                'bot_id' : self.botid,
-                'text'   : str(msg)
-                })
+        try:
+            resp = self.http.post(self.baseurl + '/bots/post', data={
+                    'bot_id' : self.botid,
+                    'text'   : str(msg)
+                    })
+
+        # Handle connection failure
+        except requests.exceptions.RequestException as err:
+            log("Message post failed - " + str(err))
+            return { 'code' : settings.code['failed'] }
 
         # Handle invalid response
         if resp.status_code != requests.codes.accepted:
@@ -51,35 +63,21 @@ class bot:
 
     # Get Groupme info for bot
     def get_botinfo(self):
-        errors = (requests.exceptions.SSLError, requests.packages.urllib3.exceptions.ProtocolError)
-
-        # Request bot info
-        url = self.baseurl + "/bots?token=" + self.token
-        retry = True
-        while (retry):
-            try:
-                resp = self.http.get(url)
-                retry = False
-            except errors as err:
-                log("Groupme Connection Failed - " + str(err))
-                log("Reattempting in 5 seconds.")
-                sleep(5)
 
-        # Handle invalid response
-        if resp.status_code != requests.codes.ok:
-            log("Unable to retrieve bot info.")
-            resp.raise_for_status()
-        
         # Load bot data
-        result = resp.json()['response']
+        result = botlist(self.token, self.http, self.baseurl)
         for x in result:
             if x['name'] == self.name:
-                self.groupid = x['group_id']
-                self.botid = x['bot_id']
-                log('Connected to Groupme as ' + repr(self.name))
+                self.load_botinfo(x)
                 break
         else:
-            sys.exit("No bots found named " + repr(self.botname))
+            sys.exit("No bots found named " + repr(self.name))
+
+    # Set bot identity from Groupme bot info
+    def load_botinfo(self, info):
+        self.groupid = info['group_id']
+        self.botid = info['bot_id']
+        log('Connected to Groupme as ' + repr(self.name) + ' in group ' + repr(self.groupid))
 
     # Get post history
     def history(self):
@@ -102,4 +100,41 @@ class bot:
             return { 'code' : settings.code['missing'] }
 
         # Success
-        return { 'code' : settings.code['success'], 'result' : posts }
\ No newline at end of file
+        return { 'code' : settings.code['success'], 'result' : posts }
+
+
+# Returns the info for all bots owned by a token
+def botlist(token, interface, baseurl='https://api.groupme.com/v3'):
+    errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.packages.urllib3.exceptions.ProtocolError)
+
+    # Request bot info
+    url = baseurl + "/bots?token=" + token
+    retry = True
+    while (retry):
+        try:
+            resp = interface.get(url)
+            retry = False
+        except errors as err:
+            log("Groupme Connection Failed - " + str(err))
+            log("Reattempting in 5 seconds.")
+            sleep(5)
+
+    # Handle invalid response
+    if resp.status_code != requests.codes.ok:
+        log("Unable to retrieve bot info.")
+        resp.raise_for_status()
+
+    return resp.json()['response']
+
+
+# Returns a bot for every group with a bot of the given name
+def bots(token, name, interface, baseurl='https://api.groupme.com/v3'):
+
+    # Match bots by name
+    result = [ bot(token, name, interface, baseurl, info=x) for x in botlist(token, interface, baseurl) if x['name'] == name ]
+
+    # No bots
+    if not len(result):
+        sys.exit("No bots found named " + repr(name))
+
+    return result
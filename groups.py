@@ -0,0 +1,134 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+# Per-group data for serving several GroupMe groups from one process
+# Each thread works on one selected group at a time
+
+import threading
+
+# group_id => { 'bot', 'state', 'users', 'lock', 'persisted' }
+shards = {}
+primary = None
+local = threading.local()
+
+
+# Forwards access to the selected group's copy of a value
+class proxy:
+
+    def __init__(self, key):
+        self.__dict__['key'] = key
+
+    def __getattr__(self, name):
+        return getattr(get(self.key), name)
+
+    def __setattr__(self, name, val):
+        setattr(get(self.key), name, val)
+
+    def __getitem__(self, item):
+        return get(self.key)[item]
+
+    def __setitem__(self, item, val):
+        get(self.key)[item] = val
+
+    def __delitem__(self, item):
+        del get(self.key)[item]
+
+    def __contains__(self, item):
+        return item in get(self.key)
+
+    def __iter__(self):
+        return iter(get(self.key))
+
+    def __len__(self):
+        return len(get(self.key))
+
+    def __repr__(self):
+        return repr(get(self.key))
+
+
+# Removes all groups
+def reset():
+    global primary
+
+    shards.clear()
+    primary = None
+
+
+# Registers a group for a bot
+def add(bot):
+    global primary
+
+    shards[bot.groupid] = {
+        'bot'   : bot,
+        'state' : {},
+        'users' : {},
+        'lock'  : threading.RLock(),
+
+        # Digests of the last stored state
+        'persisted' : { 'digests' : {}, 'time' : 0 }
+    }
+
+    # First group is the default
+    if primary is None:
+        primary = bot.groupid
+
+
+# Selects a group for the current thread
+# Returns False for unknown groups
+def select(group):
+
+    if group not in shards:
+        return False
+
+    local.group = group
+    return True
+
+
+# Returns the selected group
+def current():
+    return getattr(local, 'group', primary)
+
+
+# Iterates over all groups, selecting each in turn
+def each():
+    previous = current()
+    try:
+        for group in list(shards.keys()):
+            local.group = group
+            yield group
+    finally:
+        local.group = previous
+
+
+# Returns a value for the selected group
+def get(key, group=None):
+    if group is None:
+        group = current()
+    return shards[group][key]
+
+
+# Sets a value for the selected group
+def put(key, val, group=None):
+    if group is None:
+        group = current()
+    shards[group][key] = val
+
+
+# Returns the lock for the selected group
+def lock(group=None):
+    return get('lock', group)
@@ -0,0 +1,129 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+# Bounded work queue between the webhook and message processing
+# Messages from one group always land on the same worker to keep them in order
+# while different groups are spread across workers
+
+import threading
+import collections
+import groups
+from settings import code
+from util import log
+
+workers = []
+assigned = {}
+assigning = threading.Lock()
+dropped = 0
+counting = threading.Lock()
+
+# Drains a single message queue
+class worker(threading.Thread):
+
+    def __init__(self, handler):
+        threading.Thread.__init__(self, daemon=True)
+        self.handler = handler
+        self.queue = collections.deque()
+        self.ready = threading.Condition()
+
+    def run(self):
+        while True:
+
+            # Wait for a message
+            with self.ready:
+                while not len(self.queue):
+                    self.ready.wait()
+                data = self.queue.popleft()
+
+            # Process
+            try:
+                self.handler(data)
+            except Exception as err:
+                log("ERROR - Worker failed - " + str(err))
+
+
+# Starts the worker pool
+def start(handler, count=1):
+
+    # Already running
+    if len(workers):
+        return
+
+    for x in range(max(count, 1)):
+        w = worker(handler)
+        w.start()
+        workers.append(w)
+
+    log('Started', len(workers), 'ingest worker(s)')
+
+
+# Queues a message for processing
+# overflow - 'drop' discards the oldest queued message, 'reject' refuses the new one
+def push(data, depth=100, overflow='drop'):
+    global dropped
+
+    # Not running
+    if not len(workers):
+        log('No ingest workers running')
+        return { 'code' : code['failed'] }
+
+    # Unknown group - never given a worker
+    if data.get('group_id') not in groups.shards:
+        log('Ingest message for unknown group ignored')
+        return { 'code' : code['missing'] }
+
+    # Select worker by group
+    w = assign(data.get('group_id'))
+
+    with w.ready:
+
+        # Queue full
+        if len(w.queue) >= depth:
+
+            # Reject
+            if overflow == 'reject':
+                log('Ingest queue full - message rejected')
+                return { 'code' : code['denied'] }
+
+            # Drop oldest
+            w.queue.popleft()
+            with counting:
+                dropped += 1
+            log('Ingest queue full - oldest message dropped')
+
+        w.queue.append(data)
+        w.ready.notify()
+
+    return { 'code' : code['success'] }
+
+
+# Returns the worker for a configured group
+# New groups go to the worker serving the fewest groups
+def assign(group):
+
+    with assigning:
+        if group not in assigned:
+            load = [list(assigned.values()).count(x) for x in range(len(workers))]
+            assigned[group] = load.index(min(load))
+
+    return workers[assigned[group]]
+
+
+# Returns the number of queued messages
+def pending():
+    return sum([len(w.queue) for w in workers])
@@ -0,0 +1,119 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+# Delayed post scheduler
+# Posts wait for the response delay on a sender thread instead of the caller
+# Posts for a group queued close together are coalesced into one batch,
+# packed into as few posts as the post limit allows and sent back-to-back
+# Each group's batches are spaced at least one delay apart
+
+import time
+import heapq
+import threading
+import itertools
+from util import log
+
+queue = []
+last = {}
+batches = {}
+ready = threading.Condition()
+counter = itertools.count()
+sender = None
+
+
+# Schedules posts for a bot
+# Joins an unsent batch for the group started less than window seconds ago
+def schedule(bot, posts, delay=0, window=0, limit=None):
+
+    now = time.time()
+    with ready:
+
+        # Start sender
+        start()
+
+        # Coalesce with pending batch
+        batch = batches.get(bot.groupid)
+        if batch is not None and now - batch['created'] <= window:
+            batch['posts'] = pack(batch['posts'] + posts, limit)
+            return
+
+        # Space batches for the group
+        due = max(now, last.get(bot.groupid, 0)) + delay
+        last[bot.groupid] = due
+
+        batch = { 'bot' : bot, 'group' : bot.groupid, 'posts' : pack(posts, limit), 'due' : due, 'created' : now }
+        batches[bot.groupid] = batch
+        heapq.heappush(queue, (due, next(counter), batch))
+
+        ready.notify()
+
+
+# Joins consecutive posts while they fit within the limit
+def pack(posts, limit=None):
+
+    packed = []
+    for msg in posts:
+        if len(packed) and limit and len(packed[-1]) + 1 + len(msg) <= limit:
+            packed[-1] += '\n' + msg
+        else:
+            packed.append(msg)
+
+    return packed
+
+
+# Starts the sender thread
+def start():
+    global sender
+
+    if sender is None:
+        sender = threading.Thread(target=run, daemon=True)
+        sender.start()
+
+
+# Sends posts as they come due
+def run():
+    while True:
+
+        # Wait for next post
+        with ready:
+            while not len(queue) or queue[0][0] > time.time():
+                if len(queue):
+                    ready.wait(queue[0][0] - time.time())
+                else:
+                    ready.wait()
+            batch = heapq.heappop(queue)[2]
+
+            # Close batch
+            if batches.get(batch['group']) is batch:
+                del batches[batch['group']]
+
+        # Post back-to-back
+        for msg in batch['posts']:
+            try:
+                batch['bot'].post(msg)
+            except Exception as err:
+                log("ERROR - Post failed - " + str(err))
+
+
+# Returns the posts waiting to be sent, soonest first
+def pending():
+
+    with ready:
+        entries = [ (x[2], y) for x in sorted(queue) for y in x[2]['posts'] ]
+
+    return [ { 'group' : x['group'], 'text' : y, 'wait' : max(x['due'] - time.time(), 0) } for x, y in entries ]
@@ -18,12 +18,134 @@
 
 import re
 import settings
+from random import randint
 from util import jprint, depunctuate, log
 from settings import config, code
 
+# Command grammars - compiled once
+patterns = {
+    'shutup'        : re.compile('(?:shut(?:[-\s])?up|go\saway)(?:(?:\s+for\s+a\s+(bit|moment|while|min(?:ute)?))|(?:\s+for\s+(\d+)([smh])))?\s*[\.,!]?', re.I),
+    'unshutup'      : re.compile('(?:un[-\s]?shut[-\s]?up)|(?:come[-\s]?back)\s*[\.,!]?', re.I),
+    'restart'       : re.compile('\s*restart\s*[\.,!]?', re.I),
+    'refresh'       : re.compile('\s*refresh\s*[\.,!]?', re.I),
+    'cache'         : re.compile('(un)?cache\s+(.+)$', re.I),
+    'protect'       : re.compile('(un)?protect\s+(.+)', re.I),
+    'protectvar'    : re.compile('(un)?protect\s+var\s+(\w+)\s*[!\.]?$', re.I),
+    'syllables'     : re.compile("([\w'\s]+)\s+has\s+(\d+)\s+syllables?\s*[\.,!]?", re.I),
+    'syllablecount' : re.compile('how\s+many\s+syllables\s+(?:does|are\s+in)\s+(.+?)(?:\s+have)?(?:\s*\?)?$', re.I|re.DOTALL),
+    'query'         : re.compile('(.+)\s*~=\s*(.+)', re.I|re.DOTALL),
+    'lookup'        : re.compile('lookup\s+(.+)', re.I|re.DOTALL),
+    'literal'       : re.compile('literal\s+(.+)', re.I|re.DOTALL),
+    'last'          : re.compile('what\s+was\s+that\s*\?', re.I),
+    'edit'          : re.compile('(?:#(\d+)\s+)?sub\s+(.+)\s*=>\s*(.+)$', re.I),
+    'delete'        : re.compile('(?:forget|remove|delete)\s+((?:that)|(?:#\d+))\s*[\.!]?', re.I),
+    'alias'         : re.compile('alias\s+(.+)\s*=>\s*(.+)$', re.I),
+    'unalias'       : re.compile('un-?alias\s+(.+)$', re.I),
+    'merge'         : re.compile('merge\s+(.+)\s*=>\s*(.+)$', re.I),
+    'version'       : re.compile('(?:what\s+)?version(?:\s+are\s+you)?\s*[\?\.!]?', re.I),
+    'stats'         : re.compile('(?:stats|status)\s*[!\.\?]?', re.I),
+    'listusers'     : re.compile('list\s*users\s*[\.!]?$', re.I),
+    'more'          : re.compile('(?:more|next|continue)', re.I),
+    'undo'          : re.compile('undo[\s-]*last\s*$', re.I),
+    'listvars'      : re.compile('list\s+var(s)?(?:\s+(\w+))?\s*$', re.I),
+    'setconfig'     : re.compile('(get|list|set|disable|enable|reset)\s+(\w+)(?:\s+(\S+))?\s*$', re.I),
+    'promote'       : re.compile('((?:pro)|(?:de))mote\s+((?:that)|(?:#\d+))\s*[!\.]?$', re.I),
+    'addval'        : re.compile('((?:add)|(?:remove))\s+(?:(?:value)|(?:var))\s+(\w+)\s+(.+)', re.I),
+    'remvar'        : re.compile('(?:forget|remove|delete)\s+var\s+(\w+)\s*$', re.I),
+    'echo'          : re.compile('echo\s+(.+)$', re.I),
+    'crash'         : re.compile('crash$', re.I),
+    'random'        : re.compile('something\s*random\s*[\.!]?$', re.I),
+    'question'      : re.compile('(?:what\s+is|what\'s|the|who\s+is)\s+(.+?)[!\.\?]*$', re.I),
+    'interrogative' : re.compile('(how|what|whom?|where|why)\s+does\s+(\S+)\s+(\w+)(?:\s+(.*?))?[\?!\.]*', re.I),
+    'choice'        : re.compile('(?:choose\s+)?(?:([^,]+?)(?:\s+or|,)\s+)?([^,]+?),?\s+or\s+([^,]+?)\??$', re.I),
+    'choice_xisy'   : re.compile('.+\s+<\w+>\s+.+', re.I),
+    'yesorno'       : re.compile('(?:(?:is|does|can|are)\s+\w+)|(?:.+\?+$)', re.I),
+    'yesorno_not'  : re.compile('(?:where|when|why|how|what|who)|(?:.+\s+<\w+>\s+.+)|(?:.+\s+or\s+.+)', re.I),
+    'remember'      : re.compile('remember\s+(\S+)\s+(.+)$', re.I|re.DOTALL),
+    'xisy'          : re.compile('(.+)\s+(<\w+>)\s+(.+)', re.I|re.DOTALL),
+    'xisy_soft'     : re.compile('(.+?)\s+(is|are|am)(?:\s+also)?\s+([^\?]+)$', re.I),
+    'index'         : re.compile('#(\d+)$')
+}
+
+# Literal prefixes every match of a command starts with
+prefixes = {
+    'shutup'        : ('shut', 'go'),
+    'unshutup'      : ('un', 'come'),
+    'restart'       : ('restart',),
+    'refresh'       : ('refresh',),
+    'cache'         : ('cache', 'uncache'),
+    'protect'       : ('protect', 'unprotect'),
+    'protectvar'    : ('protect', 'unprotect'),
+    'syllablecount' : ('how',),
+    'lookup'        : ('lookup',),
+    'literal'       : ('literal',),
+    'last'          : ('what',),
+    'edit'          : ('#', 'sub'),
+    'delete'        : ('forget', 'remove', 'delete'),
+    'alias'         : ('alias',),
+    'unalias'       : ('un',),
+    'merge'         : ('merge',),
+    'version'       : ('what', 'version'),
+    'stats'         : ('stat',),
+    'listusers'     : ('list',),
+    'more'          : ('more', 'next', 'continue'),
+    'undo'          : ('undo',),
+    'listvars'      : ('list',),
+    'setconfig'     : ('get', 'list', 'set', 'disable', 'enable', 'reset'),
+    'promote'       : ('promote', 'demote'),
+    'addval'        : ('add', 'remove'),
+    'remvar'        : ('forget', 'remove', 'delete')
+}
+
+# Literals a match of a command contains anywhere
+anywhere = {
+    'syllables'     : 'syllable',
+    'query'         : '~='
+}
+
+
+# Builds a character trie from command prefixes
+# Commands are stored under None at the node ending their prefix
+def build_trie(prefixes):
+
+    trie = {}
+    for cmd in prefixes.keys():
+        for prefix in prefixes[cmd]:
+            node = trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node.setdefault(None, set()).add(cmd)
+
+    return trie
+
+trie = build_trie(prefixes)
+
+
+# Returns the commands whose grammar could match a message
+# Only these need their full parser run
+def candidates(msg):
+
+    text = msg.lstrip().lower()
+    result = set()
+
+    # Walk prefixes
+    node = trie
+    for char in text:
+        node = node.get(char)
+        if node is None:
+            break
+        result.update(node.get(None, ()))
+
+    # Contained literals
+    for cmd in anywhere.keys():
+        if anywhere[cmd] in text:
+            result.add(cmd)
+
+    return result
+
 def shutup(bag):
 
-    params = re.match('(?:shut(?:[-\s])?up|go\saway)(?:(?:\s+for\s+a\s+(bit|moment|while|min(?:ute)?))|(?:\s+for\s+(\d+)([smh])))?\s*[\.,!]?', bag['msg'], re.I)
+    params = patterns['shutup'].match(bag['msg'])
     if params:
         
         # Default Value
@@ -32,11 +154,11 @@ def shutup(bag):
         # Subjective values
         perm = None
         if params.group(1) == 'bit':
-            dur = random.randint( 4 * 60, 8 * 60 )
+            dur = randint( 4 * 60, 8 * 60 )
         elif params.group(1) == 'moment':
-            dur = random.randint( 30, 90 )
+            dur = randint( 30, 90 )
         elif params.group(1) == 'while':
-            dur = random.randint( 30 * 60, 60 * 60)
+            dur = randint( 30 * 60, 60 * 60)
         elif params.group(1) in ('min', 'minute'):
             dur = 60
 
@@ -56,7 +178,7 @@ def shutup(bag):
 
 def unshutup(bag):
 
-    if re.match('(?:un[-\s]?shut[-\s]?up)|(?:come[-\s]?back)\s*[\.,!]?', bag['msg'], re.I):
+    if patterns['unshutup'].match(bag['msg']):
 
         # Un-Shutup
         if bag['role'] in ('admin', 'op'):
@@ -64,14 +186,14 @@ def unshutup(bag):
 
 
 def restart(bag):
-    return re.match('\s*restart\s*[\.,!]?', bag['msg'], re.I)
+    return patterns['restart'].match(bag['msg'])
 
 def refresh(bag):
-    return re.match('\s*refresh\s*[\.,!]?', bag['msg'], re.I)
+    return patterns['refresh'].match(bag['msg'])
 
 def cache(bag):
 
-    match = re.match('(un)?cache\s+(.+)$', bag['msg'], re.I)
+    match = patterns['cache'].match(bag['msg'])
     if match:
         (mode, index) = match.group(1, 2)
 
@@ -88,7 +210,7 @@ def cache(bag):
 
 def protect(bag):
 
-    match = re.match('(un)?protect\s+(.+)', bag['msg'], re.I)
+    match = patterns['protect'].match(bag['msg'])
     if match:
         (mode, index) = match.group(1, 2)
 
@@ -105,7 +227,7 @@ def protect(bag):
 
 def protectvar(bag):
 
-    match = re.match('(un)?protect\s+var\s+(\w+)\s*[!\.]?$', bag['msg'], re.I)
+    match = patterns['protectvar'].match(bag['msg'])
     if match:
         (protect, var) = match.group(1, 2)
         if protect:
@@ -117,7 +239,7 @@ def protectvar(bag):
 
 
 def syllables(bag):
-    match = re.match("([\w'\s]+)\s+has\s+(\d+)\s+syllables?\s*[\.,!]?", bag['msg'], re.I)
+    match = patterns['syllables'].match(bag['msg'])
     if match:
         (subj, syll) = match.group(1, 2)
         syll = int(syll)
@@ -125,31 +247,31 @@ def syllables(bag):
 
 
 def syllablecount(bag):
-    match = re.match('how\s+many\s+syllables\s+(?:does|are\s+in)\s+(.+?)(?:\s+have)?(?:\s*\?)?$', bag['msg'], re.I|re.DOTALL)
+    match = patterns['syllablecount'].match(bag['msg'])
     if match:
         return match.group(1)
 
 def query(bag):
-    match = re.match('(.+)\s*~=\s*(.+)', bag['msg'], re.I|re.DOTALL)
+    match = patterns['query'].match(bag['msg'])
     if match:
         return { 'subj' : match.group(1), 'key' : match.group(2) }
 
 def lookup(bag):
-    match = re.match('lookup\s+(.+)', bag['msg'], re.I|re.DOTALL)
+    match = patterns['lookup'].match(bag['msg'])
     if match:
         return match.group(1)
 
 def literal(bag):
-    match = re.match('literal\s+(.+)', bag['msg'], re.I|re.DOTALL)
+    match = patterns['literal'].match(bag['msg'])
     if match:
         return match.group(1)
 
 def last(bag):
-    if re.match('what\s+was\s+that\s*\?', bag['msg'], re.I):
+    if patterns['last'].match(bag['msg']):
         return True
 
 def edit(bag):
-    match = re.match('(?:#(\d+)\s+)?sub\s+(.+)\s*=>\s*(.+)$', bag['msg'], re.I)
+    match = patterns['edit'].match(bag['msg'])
     if match:
         (key, new, old) = match.group(1, 2, 3)
         new = new.strip()
@@ -165,7 +287,7 @@ def edit(bag):
 
 
 def delete(bag):
-    match = re.match('(?:forget|remove|delete)\s+((?:that)|(?:#\d+))\s*[\.!]?', bag['msg'], re.I)
+    match = patterns['delete'].match(bag['msg'])
     if match:
 
         # Set key
@@ -173,7 +295,7 @@ def delete(bag):
         return int_index(key)
 
 def alias(bag):
-    match = re.match('alias\s+(.+)\s*=>\s*(.+)$', bag['msg'], re.I)
+    match = patterns['alias'].match(bag['msg'])
     if match:
         (src, dst) = match.group(1, 2)
         src = src.strip()
@@ -182,12 +304,12 @@ def alias(bag):
         return { 'src' : src, 'dst' : dst }
 
 def unalias(bag):
-    match = re.match('un-?alias\s+(.+)$', bag['msg'], re.I)
+    match = patterns['unalias'].match(bag['msg'])
     if match:
         return match.group(1).strip()
 
 def merge(bag):
-    match = re.match('merge\s+(.+)\s*=>\s*(.+)$', bag['msg'], re.I)
+    match = patterns['merge'].match(bag['msg'])
     if match:
         (src, dst) = match.group(1, 2)
         src = src.strip()
@@ -195,22 +317,22 @@ def merge(bag):
         return { 'src' : src, 'dst' : dst }
 
 def version(bag):
-    return re.match('(?:what\s+)?version(?:\s+are\s+you)?\s*[\?\.!]?', bag['msg'], re.I)
+    return patterns['version'].match(bag['msg'])
         
 def stats(bag):
-    return re.match('(?:stats|status)\s*[!\.\?]?', bag['msg'], re.I)
+    return patterns['stats'].match(bag['msg'])
 
 def listusers(bag):
-    return re.match('list\s*users\s*[\.!]?$', bag['msg'], re.I)
+    return patterns['listusers'].match(bag['msg'])
 
 def more(bag):
-    return re.match('(?:more|next|continue)', bag['msg'], re.I)
+    return patterns['more'].match(bag['msg'])
 
 def undo(bag):
-    return re.match('undo[\s-]*last\s*$', bag['msg'], re.I)
+    return patterns['undo'].match(bag['msg'])
 
 def listvars(bag):
-    match = re.match('list\s+var(s)?(?:\s+(\w+))?\s*$', bag['msg'], re.I)
+    match = patterns['listvars'].match(bag['msg'])
     if match:
 
         # List all vars
@@ -227,7 +349,7 @@ def listvars(bag):
         return { 'listvars' : listvars, 'var' : var }
 
 def setconfig(bag):
-    match = re.match('(get|list|set|disable|enable|reset)\s+(\w+)(?:\s+(\S+))?\s*$', bag['msg'], re.I)
+    match = patterns['setconfig'].match(bag['msg'])
     if match:
         (mode, key, val) = match.group(1, 2, 3)
 
@@ -240,7 +362,7 @@ def setconfig(bag):
         return { 'mode' : mode, 'key' : key, 'val' : val }
 
 def promote(bag):
-    match = re.match('((?:pro)|(?:de))mote\s+((?:that)|(?:#\d+))\s*[!\.]?$', bag['msg'], re.I)
+    match = patterns['promote'].match(bag['msg'])
     if match:
         (mode, key) = match.group(1, 2)
 
@@ -256,7 +378,7 @@ def promote(bag):
         return { 'mode' : mode, 'user' : key }
 
 def addval(bag):
-    match = re.match('((?:add)|(?:remove))\s+(?:(?:value)|(?:var))\s+(\w+)\s+(.+)', bag['msg'], re.I)
+    match = patterns['addval'].match(bag['msg'])
     if match:
         (mode, var, value) = match.group(1, 2, 3)
         var = depunctuate(var)
@@ -265,22 +387,22 @@ def addval(bag):
         return { 'mode' : mode, 'var' : var, 'val' : value }
 
 def remvar(bag):
-    match = re.match('(?:forget|remove|delete)\s+var\s+(\w+)\s*$', bag['msg'], re.I)
+    match = patterns['remvar'].match(bag['msg'])
     if match:
         var = match.group(1)
         var = depunctuate(var)
         return var
 
 def echo(bag):
-    match = re.match('echo\s+(.+)$', bag['msg'], re.I)
+    match = patterns['echo'].match(bag['msg'])
     if match:
         return match.group(1)
 
 def crash(bag):
-    return re.match('crash$', bag['msg'], re.I)
+    return patterns['crash'].match(bag['msg'])
 
 def random(bag):
-    return re.match('something\s*random\s*[\.!]?$', bag['msg'], re.I)
+    return patterns['random'].match(bag['msg'])
 
 def factlookup(bag):
 
@@ -291,21 +413,21 @@ def factlookup(bag):
     return False
 
 def question(bag):
-    match = re.match('(?:what\s+is|what\'s|the|who\s+is)\s+(.+?)[!\.\?]*$', bag['msg'], re.I)
+    match = patterns['question'].match(bag['msg'])
     if match:
         return match.group(1)
 
 def interrogative(bag):
-    match = re.match('(how|what|whom?|where|why)\s+does\s+(\S+)\s+(\w+)(?:\s+(.*?))?[\?!\.]*', bag['msg'], re.I)
+    match = patterns['interrogative'].match(bag['msg'])
     if match:
         (inter, name, verb, start) = match.group(1, 2, 3, 4)
         return { 'inter' : inter, 'name' : name, 'verb' : verb, 'start' : start }
 
 def choice(bag):
-    match = re.match('(?:choose\s+)?(?:([^,]+?)(?:\s+or|,)\s+)?([^,]+?),?\s+or\s+([^,]+?)\??$', bag['msg'], re.I)
+    match = patterns['choice'].match(bag['msg'])
 
     # Ignore likely "x is y" commands
-    if match and not re.match('.+\s+<\w+>\s+.+', bag['msg'], re.I):
+    if match and not patterns['choice_xisy'].match(bag['msg']):
         log('MAKING A CHOICE')
         choices = match.group(1,2,3)
 
@@ -314,12 +436,12 @@ def choice(bag):
         return choices
 
 def yesorno(bag):
-    if re.match('(?:(?:is|does|can|are)\s+\w+)|(?:.+\?+$)', bag['msg'], re.I):
-        if not re.match('(?:where|when|why|how|what|who)|(?:.+\s+<\w+>\s+.+)|(?:.+\s+or\s+.+)', bag['msg'], re.I):
+    if patterns['yesorno'].match(bag['msg']):
+        if not patterns['yesorno_not'].match(bag['msg']):
             return True
 
 def remember(bag):
-    match = re.match('remember\s+(\S+)\s+(.+)$', bag['msg'], re.I|re.DOTALL)
+    match = patterns['remember'].match(bag['msg'])
     if match:
         (name, text) = match.group(1, 2)
 
@@ -328,12 +450,12 @@ def remember(bag):
 def xisy(bag):
 
     # Hard Match
-    match = re.match('(.+)\s+(<\w+>)\s+(.+)', bag['msg'], re.I|re.DOTALL)
+    match = patterns['xisy'].match(bag['msg'])
     embed = False
 
     # Soft Match
     if not match:
-        match = re.match('(.+?)\s+(is|are|am)(?:\s+also)?\s+([^\?]+)$', bag['msg'], re.I)
+        match = patterns['xisy_soft'].match(bag['msg'])
         embed = True
 
 
@@ -355,7 +477,7 @@ def xisy(bag):
 def int_index(string):
 
     # String Number
-    match = re.match('#(\d+)$', string)
+    match = patterns['index'].match(string)
     if match:
         index = int(match.group(1))
         return index
@@ -1,9 +1,12 @@
 # All Caps
 # Generates a response if an all caps post is made
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('^[\sA-Z]*[A-Z]{4,}\s+[\sA-Z]{4,}[\?!\.]*$')
+
 def main(bag, config):
 
-	if re.match('[\sA-Z]*[A-Z]{4,}\s+[\sA-Z]{4,}[\?!\.]*$', bag['msg']):
+	if trigger.match(bag['msg']):
 		return { 'lookup' : '[allcaps]' }
\ No newline at end of file
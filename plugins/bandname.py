@@ -1,8 +1,11 @@
 # Band Names
 # Identifies potential band names and learns them
-# Version 1.1.1
+# Version 1.2.0
 import re
 
+# Trigger - 3 Words
+trigger = re.compile('^\s*\S+\s+\S+\s+\S+\s*$')
+
 def main(bag, config):
 
     # Ignore Commands
@@ -1,9 +1,13 @@
 # Get Berkhout Fact from Twitter
 # Substitutes Captain Berkhout for Chuck Norris
 # Set key - 'berkhoutfact_source' to change the twitter source
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('^(?:captain|cpt|capt)?\s*berkhout\s*fact', re.I)
+addressed = True
+
 def main(bag, config):
 
     if 'berkhoutfact_source' in config.keys():
@@ -11,7 +15,7 @@ def main(bag, config):
     else:
         source = 'CNorrisLegend'
 
-    if bag['addressed'] and re.match('(?:captain|cpt|capt)?\s*berkhout\s*fact', bag['msg'], re.I):
+    if bag['addressed'] and trigger.match(bag['msg']):
         return { 'call' : 'twitter', 'username' : source }
 
 def recall(bag, config, tweets):
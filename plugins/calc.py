@@ -1,13 +1,17 @@
 # Math plugin
-# Version 1.0.0
+# Version 1.1.0
 from __future__ import division
 import re
 import collections
 
+# Trigger - All valid expression characters
+trigger = re.compile('^(\-?\d[\s0-9a-fA-F_x\^+\-\*%/.()]+\d)$')
+addressed = True
+
 def main(bag, config):
 
     # All valid expression characters
-    match = re.match('(\-?\d[\s0-9a-fA-F_x\^+\-\*%/.()]+\d)$', bag['msg'])
+    match = trigger.match(bag['msg'])
 
     # Fix multiplication with 'x'
     exp = bag['msg']
@@ -1,8 +1,12 @@
 # Get Cat Fact from Twitter
 # Set key - 'catfact_source' to change the twitter source
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('^cat\s*fact', re.I)
+addressed = True
+
 def main(bag, config):
 
     if 'catfact_source' in config.keys():
@@ -10,7 +14,7 @@ def main(bag, config):
     else:
         source = 'catfacts101'
 
-    if bag['addressed'] and re.match('cat\s*fact', bag['msg'], re.I):
+    if bag['addressed'] and trigger.match(bag['msg']):
         return { 'call' : 'twitter', 'username' : source }
 
 def recall(bag, config, tweets):
@@ -1,6 +1,6 @@
 # CSDS5
 # Responds to mentions of CSDS-5 with a factoid
-# Version 1.0.0
+# Version 1.1.0
 import re
 import random
 
@@ -13,6 +13,9 @@ response = [
 	'@' + user + ', do you know anything about that?'
 	]
 
+# Trigger
+trigger = re.compile('CSDS-?5|(?:sub-?)?devron 5', re.I)
+
 def main(bag, config):
 
 	# Ignore if posted by target user
@@ -20,5 +23,5 @@ def main(bag, config):
 		return
 
 	# Return random response
-	if re.search('CSDS-?5|(?:sub-?)?devron 5', bag['msg'], re.I):
+	if trigger.search(bag['msg']):
 		return random.choice(response)
\ No newline at end of file
@@ -1,18 +1,38 @@
 # Finds contextual numbers
-# Version 1.0.4
+# Version 1.3.0
+import os
 import re
 import json
+import math
 import pint
+import array
+import bisect
+import pickle
 import string
 import random
+import hashlib
+import functools
 
 from pint import UnitRegistry
 ureg = UnitRegistry('lib/dictofnumbers/unit_def.txt', autoconvert_offset_to_baseunit=True)
 
+# Database and its preprocessed index
+db = 'lib/dictofnumbers/dictofnumbers.json'
+compiled = 'lib/dictofnumbers/dictofnumbers.bin'
+
+# db unit => entries sorted by number with the bounds of their ranges
+#   'low', 'high' - arrays of range bounds
+#   'entries'     - (position in db, number, text, source, unit)
 data = None
 units = None
 width = 10
 
+# (base units, standard unit) - built by init()
+conversions = []
+
+# Unit tokens with conversions kept in memory
+cache_size = 1024
+
 unit_table = {
     'kgs' : 'kg',
     'hz'  : 'hertz',
@@ -49,21 +69,112 @@ def init():
     global units
 
     # Load data
-    db = 'lib/dictofnumbers/dictofnumbers.json'
-    json_data=open(db).read()
-    data = json.loads(json_data)
+    with open(db, 'rb') as f:
+        json_data = f.read()
+    digest = hashlib.sha1(json_data + str(width).encode()).hexdigest()
+
+    # Preprocessed index
+    data = None
+    try:
+        with open(compiled, 'rb') as f:
+            stored = pickle.load(f)
+        if stored['digest'] == digest:
+            data = stored['units']
+    except (IOError, OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+        pass
+
+    # Rebuild index
+    if data is None:
+        data = index(json.loads(json_data.decode('utf-8')))
+        try:
+            with open(compiled + '.tmp', 'wb') as f:
+                pickle.dump({ 'digest' : digest, 'units' : data }, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(compiled + '.tmp', compiled)
+        except (IOError, OSError):
+            pass
 
     # Get Units
     units = data.keys()
 
-    # Construct Ranges
-    for x in units:
-        for y in data[x]:
-            y['low']  = y['number'] * (100 - width) / 100
-            y['high'] = y['number'] * (100 + width) / 100
+    # Standard units for base units
+    conversions[:] = [
+        # Convert sec^-1 to Hz
+        ((1 / ureg.second).units, ureg.hertz),
+        ((ureg.radian / ureg.second).units, ureg.hertz),
+        # Convert A-s t0 C
+        ((ureg.ampere * ureg.second).units, ureg.coulomb),
+        # Convert cd*rad to lm
+        ((ureg.candela * ureg.radian ** 2).units, ureg.lumen),
+        # Convert gram to kg
+        (ureg.gram.units, ureg.kilogram),
+        # Convert g/m^3 to kg/m^3
+        ((ureg.gram / ureg.meter ** 3).units, ureg.kilogram / ureg.meter ** 3),
+        # Convert g-m^2/A^2-s^3 to ohms
+        ((ureg.gram * ureg.meter ** 2 / ureg.ampere ** 2 / ureg.second ** 3).units, ureg.ohm),
+        # Convert g-m^2/s^2 to joules
+        ((ureg.gram * ureg.meter ** 2 / ureg.second ** 2).units, ureg.joule),
+        # Convert g-m/s^2 to newtons
+        ((ureg.gram * ureg.meter / ureg.second ** 2).units, ureg.newton),
+        # Convert g/A-s^2 to teslas
+        ((ureg.gram / ureg.ampere / ureg.second ** 2).units, ureg.tesla),
+        # Convert g-m^2/s^3 to watts
+        ((ureg.gram * ureg.meter ** 2 / ureg.second ** 3).units, ureg.watt),
+        # Convert g-m^2/A-s^3 to volts
+        ((ureg.gram * ureg.meter ** 2 / ureg.ampere / ureg.second ** 3).units, ureg.volt),
+        # Convert g-m^2/K-s^2 to g-m^2/K-s^2 (J/K)
+        ((ureg.gram * ureg.meter ** 2 / ureg.kelvin / ureg.second ** 2).units, ureg.kilogram * ureg.meter ** 2 / ureg.kelvin / ureg.second ** 2)
+    ]
+    resolve.cache_clear()
 
     print('Dictionary of Numbers Initialized.')
 
+# Sorts each unit's entries by number
+# The range bounds grow with the number, so the entries in range of a value are consecutive
+def index(raw):
+
+    table = {}
+    for unit, entries in raw.items():
+
+        # Construct Ranges - ranges of negative numbers are empty
+        rows = []
+        for pos, y in enumerate(entries):
+            low  = y['number'] * (100 - width) / 100
+            high = y['number'] * (100 + width) / 100
+            if low <= high:
+                rows.append((y['number'], pos, low, high, y['text'], y['source'], y['unit']))
+        rows.sort()
+
+        table[unit] = {
+            'low'     : array.array('d', [x[2] for x in rows]),
+            'high'    : array.array('d', [x[3] for x in rows]),
+            'entries' : [(x[1], x[0], x[4], x[5], x[6]) for x in rows]
+        }
+
+    return table
+
+# Returns the entries whose range holds a value, in database order
+def inrange(db_unit, magnitude):
+
+    if math.isnan(magnitude):
+        return []
+
+    table = data[db_unit]
+    first = bisect.bisect_left(table['high'], magnitude)
+    last = bisect.bisect_right(table['low'], magnitude)
+
+    context = []
+    for (pos, number, text, source, unit) in sorted(table['entries'][first:last]):
+        context.append({
+            'number' : number,
+            'text'   : text,
+            'source' : source,
+            'unit'   : unit,
+            'low'    : number * (100 - width) / 100,
+            'high'   : number * (100 + width) / 100
+        })
+
+    return context
+
 def getContext(val, unit):
 
     # Lookup Units
@@ -73,39 +184,66 @@ def getContext(val, unit):
     if not unit:
         return []
 
+    # Resolve Units
+    resolved = resolve(unit)
+    if resolved is None:
+        return []
+    (scale, offset, db_unit) = resolved
+
+    # Convert Value
+    if scale is None:
+        magnitude = float(convertUnits(val * ureg.parse_expression(unit)).magnitude)
+    else:
+        magnitude = val * scale + offset
+
+    # Get Context
+    context = inrange(db_unit, magnitude)
+
+    if len(context):
+        return { 'val' : val, 'unit' : unit, 'context' : context, '_unit' : db_unit, '_val' : magnitude }
+
+    return []
+    
+
+# Maps a unit to its DB unit and the scale and offset converting values to it
+# Scale and offset are None if the conversion isn't linear
+# None if the unit is unknown, unparsable or has no DB unit
+@functools.lru_cache(maxsize=cache_size)
+def resolve(unit):
+
     # Generate Quantity
     try:
-        qty = val * ureg.parse_expression(unit)
-    except pint.UndefinedUnitError as e:
-        return []
+        qty = ureg.parse_expression(unit)
+    except (pint.UndefinedUnitError, SyntaxError) as e:
+        return None
+
+    # Plain numbers
+    if not isinstance(qty, ureg.Quantity):
+        return None
 
     # Convert Units
-    qty = convertUnits(qty)
+    points = [convertUnits(x * qty) for x in (0.0, 1.0, 2.0)]
 
     # Lookup DB Units
-    if str(qty.units) in base_units.keys():
-        db_unit = base_units[str(qty.units)]
+    if str(points[1].units) in base_units.keys():
+        db_unit = base_units[str(points[1].units)]
     else:
-        print('Dict of Numbers Error: Base Unit ' + repr(qty.units) + ' not found!')
-        return []
+        print('Dict of Numbers Error: Base Unit ' + repr(points[1].units) + ' not found!')
+        return None
 
     # Unit check
     if db_unit not in units:
         print('Dict of Numbers Error: DB Unit ' + repr(db_unit) + ' not found!')
-        return []
+        return None
 
-    # Get Context
-    context = []
-    magnitude = float(qty.magnitude)
-    for x in data[db_unit]:
-         if magnitude >= x['low'] and magnitude <= x['high']:
-            context.append(x)
+    # Scale and offset
+    (zero, one, two) = [float(x.magnitude) for x in points]
+    scale = one - zero
+    if not math.isclose(two, zero + 2 * scale, rel_tol=1e-9, abs_tol=1e-300):
+        return (None, None, db_unit)
 
-    if len(context):
-        return { 'val' : val, 'unit' : unit, 'context' : context, '_unit' : db_unit, '_val' : magnitude }
+    return (scale, zero, db_unit)
 
-    return []
-    
 
 # Converts a given value to standardized units
 def convertUnits(qty):
@@ -113,46 +251,17 @@ def convertUnits(qty):
     # Standardize Units
     qty.ito_base_units()
 
-    # Convert sec^-1 to Hz
-    if qty.units == (1 / ureg.second).units or qty.units == (ureg.radian / ureg.second).units:
-        qty.ito(ureg.hertz)
-    # Convert A-s t0 C
-    elif qty.units == (ureg.ampere * ureg.second).units:
-        qty.ito(ureg.coulomb)
-    # Convert cd*rad to lm
-    elif qty.units == (ureg.candela * ureg.radian ** 2).units:
-        qty.ito(ureg.lumen)
-    # Convert gram to kg
-    elif qty.units == ureg.gram.units:
-        qty.ito(ureg.kilogram)
-    # Convert g/m^3 to kg/m^3
-    elif qty.units == (ureg.gram / ureg.meter ** 3).units:
-        qty.ito(ureg.kilogram / ureg.meter ** 3)
-    # Convert g-m^2/A^2-s^3 to ohms
-    elif qty.units == (ureg.gram * ureg.meter ** 2 / ureg.ampere ** 2 / ureg.second ** 3).units:
-        qty.ito(ureg.ohm)
-    # Convert g-m^2/s^2 to joules
-    elif qty.units == (ureg.gram * ureg.meter ** 2 / ureg.second ** 2).units:
-        qty.ito(ureg.joule)
-    # Convert g-m/s^2 to newtons
-    elif qty.units == (ureg.gram * ureg.meter / ureg.second ** 2).units:
-        qty.ito(ureg.newton)
-    # Convert g/A-s^2 to teslas
-    elif qty.units == (ureg.gram / ureg.ampere / ureg.second ** 2).units:
-        qty.ito(ureg.tesla)
-    # Convert g-m^2/s^3 to watts
-    elif qty.units == (ureg.gram * ureg.meter ** 2 / ureg.second ** 3).units:
-        qty.ito(ureg.watt)
-    # Convert g-m^2/A-s^3 to volts
-    elif qty.units == (ureg.gram * ureg.meter ** 2 / ureg.ampere / ureg.second ** 3).units:
-        qty.ito(ureg.volt)
-    # Convert g-m^2/K-s^2 to g-m^2/K-s^2 (J/K)
-    elif qty.units == (ureg.gram * ureg.meter ** 2 / ureg.kelvin / ureg.second ** 2).units:
-        qty.ito(ureg.kilogram * ureg.meter ** 2 / ureg.kelvin / ureg.second ** 2)
+    for (base, standard) in conversions:
+        if qty.units == base:
+            qty.ito(standard)
+            break
 
     return qty
 
 
+# Trigger - Any number
+trigger = re.compile('\d')
+
 def main(bag, config):
 
     # Isolate Values
@@ -1,9 +1,12 @@
 # Do you know?
 # Responds to 'do you know' and 'does anyone know'
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('^(?:Do\s+you|Does\s+anyone)\s+know\s+(\w+)', re.I)
+
 def main(bag, config):
 
-	if re.match('(?:Do\s+you|Does\s+anyone)\s+know\s+(\w+)', bag['msg'], re.I):
+	if trigger.match(bag['msg']):
 		return 'No, but if you hum a few bars I can fake it.'
\ No newline at end of file
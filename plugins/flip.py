@@ -1,14 +1,17 @@
 # Flip
 # Flips text
-# Version 1.0.0
+# Version 1.1.0
 import re
 from plugins.flip_lib import upsidedown
 
+# Trigger
+trigger = re.compile('^(?:flip\s+(.+))', re.I)
+
 def main(bag, config):
 
     limit = 20
 
-    match = re.match('(?:flip\s+(.+))', bag['msg'], re.I)
+    match = trigger.match(bag['msg'])
     if not match:
         return
 
@@ -1,12 +1,15 @@
 # Hooyah 23
 # Responds to mentions of 23
-# Version 1.0.1
+# Version 1.1.0
 import re
 
-def main(bag, config):
+max_seperation = 8
+
+# Trigger
+trigger = re.compile('((?:\s|^)(?:2|two|twenty)\D{0,' + str(max_seperation) + '}(?:3|three)(?:\s|$))', re.I)
 
-    max_seperation = 8
+def main(bag, config):
 
-    match = re.search('((?:\s|^)(?:2|two|twenty)\D{0,' + str(max_seperation) + '}(?:3|three)(?:\s|$))', bag['msg'], re.I)
+    match = trigger.search(bag['msg'])
     if match:
         return 'Hooyah 23!'
\ No newline at end of file
@@ -1,11 +1,14 @@
 # Hyphen Swap
 # Shifts the hyphen in a phrase
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('(\w+)-ass\s+(\w+)', re.I)
+
 def main(bag, config):
 
-	match = re.search('(\w+)-ass\s+(\w+)', bag['msg'], re.I)
+	match = trigger.search(bag['msg'])
 	if match != None:
 		msg = re.sub('(\w+)-ass\s+(\w+)', '\g<1> ass-\g<2>', bag['msg'], re.I)
 		return msg
\ No newline at end of file
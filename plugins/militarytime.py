@@ -1,11 +1,14 @@
 # Military Time
 # Converts time to military time
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile(r'\b(\d{1,2})(?:\:(\d{2}))?([ap])m\b', re.I)
+
 def main(bag, config):
     
-    match = re.search(r'\b(\d{1,2})(?:\:(\d{2}))?([ap])m\b', bag['msg'], re.I)
+    match = trigger.search(bag['msg'])
     if match != None:
         hour, minute, period = match.group( 1, 2, 3 )
         hour = int(hour)
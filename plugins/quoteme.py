@@ -1,8 +1,11 @@
 # Quote Me
 # Quotes people who do not want to be quoted
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('^don\'t quote me(?: on this)?, but (.+)', re.I)
+
 def main(bag, config):
 
     # Ignore Commands
@@ -14,7 +17,7 @@ def main(bag, config):
         return
 
     # Don't Quote Me
-    match = re.match('don\'t quote me(?: on this)?, but (.+)', bag['msg'], re.I)
+    match = trigger.match(bag['msg'])
     if match == None:
         return
 
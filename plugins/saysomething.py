@@ -1,10 +1,13 @@
 # Say Something
 # Says something like a smartass
-# Version 1.0.1
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('^say (.*)', re.I|re.DOTALL)
+
 def main(bag, config):
 
-	match = re.match('say (.*)', bag['msg'], re.I|re.DOTALL)
+	match = trigger.match(bag['msg'])
 	if match != None:
 		return match.group(1) + '!'
\ No newline at end of file
@@ -1,11 +1,14 @@
 # sexchange
 # changes 'ex' to 'sex'
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile(r'\b(ex.*)\b', re.I)
+
 def main(bag, config):
 
-    match = re.search(r'\b(ex.*)\b', bag['msg'], re.I)
+    match = trigger.search(bag['msg'])
     if match != None and match.group(1) not in ('extra', 'except'):
         if re.search(r'\ban ex', bag['msg']):
             msg = re.sub(r'\ban ex', 'a sex', bag['msg'], 1, re.I)
@@ -1,10 +1,12 @@
 # Silence
 # Generates a response to posted elipses or other indicators of a silent response
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger - 3 or more '.'
+trigger = re.compile(r'^\.\.\.+$')
+
 def main(bag, config):
 
-	# 3 or more '.'
-	if re.match(r'\.\.\.+$', bag['msg']):
+	if trigger.match(bag['msg']):
 		return { 'lookup' : '[silence]' }
\ No newline at end of file
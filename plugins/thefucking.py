@@ -1,11 +1,14 @@
 # The Fucking
 # Re-arranges 'the fucking' to 'fucking the'
-# Version 1.0.0
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('the\s+fucking', re.I)
+
 def main(bag, config):
 
-    msg = re.sub('the\s+fucking', 'fucking the', bag['msg'], 1, re.I)
+    msg = trigger.sub('fucking the', bag['msg'], 1)
 
     if msg != bag['msg']:
         return msg
\ No newline at end of file
@@ -1,11 +1,13 @@
 # Matches a 3-letter acronym with a band name
-# Version 1.0.1
+# Version 1.1.0
 import re
 
+# Trigger - 3 Capital Letters
+trigger = re.compile('^([A-Z])([A-Z])([A-Z])\??$')
+
 def main(bag, config):
 
-    # 3 Capital Letters
-    if re.match('([A-Z])([A-Z])([A-Z])\??$', bag['msg']):
+    if trigger.match(bag['msg']):
         return { 'call' : 'getvar', 'var' : 'band' }
 
 def recall(bag, config, bands):
@@ -15,7 +17,7 @@ def recall(bag, config, bands):
         return
 
     # Extract Letters
-    match = re.match('([A-Z])([A-Z])([A-Z])\??$', bag['msg'])
+    match = trigger.match(bag['msg'])
     pattern = match.group(1, 2, 3)
     
     # Look for match
@@ -1,12 +1,15 @@
 # Trump Speech
 # Generates a random Donald Trump speech
-# Version 1.0.0
+# Version 1.1.0
 import re
 from plugins.trumpspeech_lib import markov
 
 
+# Trigger
+trigger = re.compile('^trump\s*speech', re.I)
+
 def main(bag, config):
-    if re.match('trump\s*speech', bag['msg'], re.I):
+    if trigger.match(bag['msg']):
         resp = markov.generate('plugins/trumpspeech_lib/trumpspeech.txt', 200)
         resp = '...' + resp + '...'
         return resp
@@ -1,28 +1,156 @@
-import random
+import os
 import sys
+import mmap
+import array
+import random
+import struct
+import hashlib
+import threading
 #Markov Chain Text Generator using triplets of words; written for trumpify (http://ahaym.github.io/trumpify)
 #Big thanks to Shabda Raj for an excellent article on Markov Chain- Based Text Generation (http://agiliq.com/blog/2009/06/generating-pseudo-random-text-with-markov-chains-u/)
 
-def generate(file, size):
-    with open(file, 'r') as myfile:
-        text = myfile.read().replace('\n', ' ').split()
-    markov = []
-    triplets = {}
-    for i in range(0, len(text) - 4):
-        w1, w2, w3 = text[i], text[i+1], text[i+2]
-        key = (w1, w2)
-        if key in triplets:
-            triplets[key].append(w3)
-        else:
-            triplets[key] = [w3]
-
-    initial = random.randint(0, len(text)-3)
-    w1, w2 = text[initial], text[initial+1]
-    for i in range(0, size):
-        markov.append(w1)
-        w1, w2 = w2, random.choice(triplets[(w1, w2)])
-    markov.append(w2)
-    return ' '.join(markov)
+# The chain for a corpus is built once and saved next to it as <corpus>.<order>.chain
+# Layout - header, then uint32 arrays and the vocabulary:
+#   text    - the corpus as token ids
+#   state   - position => id of the state (order tokens) starting there
+#   offsets - state id => start of its run in follow
+#   follow  - positions grouped by state, only those with a token after the state
+#   vocab   - token strings joined by newlines
+magic = b'BRKMKV1\n'
+header = struct.Struct('<8s20sIIII')
+
+# (file, order) => chain
+chains = {}
+loading = threading.Lock()
+
+# Order-n Markov chain over a buffer
+class chain:
+
+    def __init__(self, buf):
+        (mark, digest, order, size, states, follows) = header.unpack_from(buf, 0)
+        view = memoryview(buf)
+
+        self.buf = buf
+        self.digest = digest
+        self.order = order
+
+        start = header.size
+        sections = []
+        for count in (size, size - order + 1, states + 1, follows):
+            count = max(count, 0)
+            sections.append(view[start : start + 4 * count].cast('I'))
+            start += 4 * count
+        (self.text, self.state, self.offsets, self.follow) = sections
+
+        self.vocab = bytes(view[start:]).decode('utf-8').split('\n')
+
+    # Returns size + order - 1 tokens
+    def walk(self, size):
+
+        if not len(self.follow):
+            return []
+
+        # Start anywhere
+        pos = random.randint(0, len(self.state) - 1)
+        tokens = list(self.text[pos : pos + self.order])
+
+        while len(tokens) < size + self.order - 1:
+            state = self.state[pos]
+            first = self.offsets[state]
+            last = self.offsets[state + 1]
+
+            # Dead end - continue from anywhere
+            if first == last:
+                (first, last) = (0, len(self.follow))
+
+            # Follow one of the state's occurrences
+            pos = self.follow[random.randint(first, last - 1)]
+            tokens.append(self.text[pos + self.order])
+            pos += 1
+
+        return [self.vocab[x] for x in tokens]
+
+# Compiles a corpus into a chain
+def build(text, order, digest):
+
+    tokens = text.decode('utf-8').split()
+
+    # Intern tokens
+    ids = {}
+    corpus = array.array('I', [ids.setdefault(x, len(ids)) for x in tokens])
+    vocab = sorted(ids.keys(), key=lambda x: ids[x])
+
+    # Number the states
+    numbers = {}
+    state = array.array('I', [numbers.setdefault(tuple(corpus[x : x + order]), len(numbers)) for x in range(len(corpus) - order + 1)])
+
+    # Group the positions followed by a token by state
+    groups = [[] for x in range(len(numbers))]
+    for pos in range(len(corpus) - order):
+        groups[state[pos]].append(pos)
+
+    offsets = array.array('I', [0])
+    follow = array.array('I')
+    for group in groups:
+        follow.extend(group)
+        offsets.append(len(follow))
+
+    return b''.join([
+        header.pack(magic, digest, order, len(corpus), len(numbers), len(follow)),
+        corpus.tobytes(),
+        state.tobytes(),
+        offsets.tobytes(),
+        follow.tobytes(),
+        ('\n').join(vocab).encode('utf-8')
+    ])
+
+# Returns the chain for a corpus, building and saving it when the corpus has changed
+def load(file, order=2):
+
+    key = (file, order)
+    if key in chains:
+        return chains[key]
+
+    with loading:
+        if key not in chains:
+
+            with open(file, 'rb') as f:
+                text = f.read()
+            digest = hashlib.sha1(text + str(order).encode()).digest()
+            compiled = file + '.' + str(order) + '.chain'
+
+            # Saved chain
+            model = None
+            try:
+                with open(compiled, 'rb') as f:
+                    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if buf[:len(magic)] == magic and header.unpack_from(buf, 0)[1] == digest:
+                    model = chain(buf)
+                else:
+                    buf.close()
+            except (IOError, OSError, ValueError, struct.error):
+                pass
+
+            # Rebuild
+            if model is None:
+                data = build(text, order, digest)
+                try:
+                    with open(compiled + '.tmp', 'wb') as f:
+                        f.write(data)
+                    os.replace(compiled + '.tmp', compiled)
+                except (IOError, OSError):
+                    pass
+                model = chain(data)
+
+            chains[key] = model
+
+    return chains[key]
+
+def generate(file, size, order=2):
+    return ' '.join(load(file, order).walk(size))
 
 if __name__ == '__main__':
-    print(generate(sys.argv[1], size=int(sys.argv[2])))
\ No newline at end of file
+    if len(sys.argv) > 3:
+        print(generate(sys.argv[1], size=int(sys.argv[2]), order=int(sys.argv[3])))
+    else:
+        print(generate(sys.argv[1], size=int(sys.argv[2])))
\ No newline at end of file
@@ -1,13 +1,39 @@
 # Gets a brief summary of a subject from wikipedia
-# Version 1.1.0
+# Version 1.3.0
 import re
 import json
+import time
 import requests
 import random
+import threading
+import collections
+import concurrent.futures
+import transport
 import nltk
 
 baseurl = 'http://en.wikipedia.org/w/api.php'
 
+# Extract cache - (title, sentences) => (expires, (extract, url, links))
+# Disambiguation pages keep their links so each lookup picks a fresh one
+cache = collections.OrderedDict()
+cache_size = 512
+ttl = 6 * 60 * 60
+
+# (title, sentences) => future of an extract being fetched
+inflight = {}
+lock = threading.Lock()
+wait = 10
+
+# Disambiguation pages followed per lookup
+hops = 3
+
+# Prefetched random extracts
+pool = collections.deque()
+pool_size = 5
+pool_retry = 60
+refill = threading.Condition()
+filler = None
+
 # Return an extract of a random page
 def random_page(size=10):
 
@@ -18,7 +44,7 @@ def random_page(size=10):
         'rnlimit'        : size,
     }
 
-    resp = requests.get(baseurl, params=payload)
+    resp = transport.http.get(baseurl, params=payload)
 
     if resp.status_code != requests.codes.ok:
         return
@@ -59,7 +85,7 @@ def getpage(titles=None, pageid=None, sentences=1):
     else:
         payload['pageids'] = pageid
 
-    resp = requests.get(baseurl, params=payload)
+    resp = transport.http.get(baseurl, params=payload)
 
     if resp.status_code != requests.codes.ok:
         return
@@ -72,17 +98,150 @@ def getpage(titles=None, pageid=None, sentences=1):
 
 # Returns an extract of a page
 # Random page if not specified
-def extract(titles=None, pageid=None, sentences=1):
+def extract(titles=None, pageid=None, sentences=1, depth=0):
+
+    # Random page
+    if titles is None and pageid is None:
+        return random_extract(sentences)
+
+    # Page by id
+    if titles is None:
+        return follow(fetch(pageid=pageid, sentences=sentences)[0:3], sentences, depth)
+
+    key = (normalize(titles), sentences)
+    with lock:
+
+        # Cached
+        entry = cache.get(key)
+        if entry is not None and entry[0] > time.time():
+            cache.move_to_end(key)
+            owner = None
+
+        # Join a fetch in progress
+        elif key in inflight:
+            owner = False
+            future = inflight[key]
+
+        else:
+            owner = True
+            future = concurrent.futures.Future()
+            inflight[key] = future
+
+    if owner is None:
+        return follow(entry[1], sentences, depth)
+
+    if not owner:
+        try:
+            return follow(future.result(wait), sentences, depth)
+        except concurrent.futures.TimeoutError:
+            return None, None
+
+    try:
+        (ex, url, links, final) = fetch(titles=titles, sentences=sentences)
+        future.set_result((ex, url, links))
+
+    except Exception as e:
+        future.set_exception(e)
+        raise
+
+    finally:
+        with lock:
+            del inflight[key]
+
+            # Store
+            if future.done() and not future.exception() and final:
+                cache[key] = (time.time() + ttl, (ex, url, links))
+                cache.move_to_end(key)
+                while len(cache) > cache_size:
+                    cache.popitem(last=False)
+
+    return follow((ex, url, links), sentences, depth)
+
+
+# Follows a random link of a disambiguation page
+# Runs after the page's own fetch has finished so lookups never wait on themselves
+def follow(result, sentences=1, depth=0):
+
+    (ex, url, links) = result
+    if links is None:
+        return ex, url
+
+    if depth >= hops or not len(links):
+        return None, None
+
+    return extract(titles=random.choice(links), sentences=sentences, depth=depth+1)
+
+
+# Normalizes a title for caching
+def normalize(title):
+    return (' ').join(title.split()).lower()
+
+
+# Returns a prefetched random extract, fetching one if none are ready
+def random_extract(sentences=1):
+
+    start()
+
+    if sentences == 1:
+        with refill:
+            if len(pool):
+                result = pool.popleft()
+                refill.notify()
+                return result
+
+    return follow(fetch(sentences=sentences)[0:3], sentences)
+
+
+# Starts the random page prefetcher
+def start():
+    global filler
+
+    with refill:
+        if filler is None:
+            filler = threading.Thread(target=prefetch, daemon=True)
+            filler.start()
+
+
+# Keeps the pool of random extracts full
+def prefetch():
+    while True:
+
+        # Wait for room
+        with refill:
+            while len(pool) >= pool_size:
+                refill.wait()
+
+        try:
+            (ex, url) = follow(fetch()[0:3])
+        except Exception:
+            ex = None
+
+        # Back off after failures
+        if ex is None:
+            time.sleep(pool_retry)
+            continue
+
+        with refill:
+            pool.append((ex, url))
+
+
+# Fetches an extract of a page
+# Returns the extract, url, disambiguation links and whether the result may be cached
+def fetch(titles=None, pageid=None, sentences=1):
 
     page = getpage(titles=titles, pageid=pageid, sentences=sentences)
 
+    # Request failed
+    if page is None:
+        return None, None, None, False
+
     # No Matches
-    if page is None or 'missing' in page.keys():
-        return None, None
+    if 'missing' in page.keys():
+        return None, None, None, True
 
     # Filter redirects
     if 'redirect' in page.keys():
-        return None, None
+        return None, None, None, True
 
     ex = page['extract']
     url = page['fullurl']
@@ -93,26 +252,30 @@ def extract(titles=None, pageid=None, sentences=1):
     # Trim sentences
     ex = ('  ').join(nltk.tokenize.sent_tokenize(ex)[0:sentences])
 
-    # Follow random disambiguation
+    # Disambiguation links
     if 'categories' in page.keys():
         if 'extract' not in page.keys() or re.search('refers? to:$',page['extract'], re.I):
             for x in page['categories']:
                 if x['title'] in ('Category:All disambiguation pages', 'Category:All set index articles'):
-                    (ex, url) = extract(titles=random.choice(page['links'])['title'],sentences=sentences)
-                    break
+                    return None, None, [ y['title'] for y in page['links'] ], True
+
+    return ex, url, None, True
 
-    return ex, url
+# Triggers
+something = re.compile('^something\s*(?:interesting|random)\s*[\.!]?$', re.I)
+question = re.compile(r'^(?:what\s+(?:is|are)|what\'s|who\'s|who\s+(?:is|are))\s+(?:(?:a|the)\s+)?(.+?)\?*$', re.I)
+trigger = (something, question)
 
 def main(bag, config):
 
     # Something Random
-    if bag['addressed'] and re.match('something\s*(?:interesting|random)\s*[\.!]?$', bag['msg'], re.I):
+    if bag['addressed'] and something.match(bag['msg']):
         (ex, url) = extract()
 
     else:
 
         # Test for question
-        match = re.match(r'(?:what\s+(?:is|are)|what\'s|who\'s|who\s+(?:is|are))\s+(?:(?:a|the)\s+)?(.+?)\?*$', bag['msg'], re.I)
+        match = question.match(bag['msg'])
         if match is not None:
             subj = match.group(1).title()
 
@@ -1,10 +1,42 @@
 # Query Wolfram-Alpha for question answers
-# Version 1.0.1
+# Set key - 'wolfram_quota' to change the monthly query limit per appid
+# Set key - 'wolfram_ttl' to change how many seconds answers are cached
+# Version 1.4.0
 import re
 import json
+import time
+import shelve
 import urllib
 import requests
-import xmltodict
+import threading
+import transport
+import xml.etree.ElementTree as etree
+
+baseurl = 'http://api.wolframalpha.com/v2/query'
+
+# Deadlines in seconds - (connect, read) for the request, server-side for the query
+# and for the whole answer, all inside the plugin timeout
+timeout = (2, 3)
+query_timeout = 4
+deadline = 5
+
+# Session without retries - a retried query could outlast the plugin timeout
+http = transport.session()
+
+# Answer cache - normalized query => { 'expires', 'result' }
+# Quotas - 'quota:' + appid => { 'month', 'calls' }
+cache_file = 'lib/wolfram.cache'
+ttl = 60 * 60
+db = None
+lock = threading.Lock()
+
+# Time-dependent questions and pods are never cached
+# Pod ids run words together, so they are matched without word boundaries
+changing = re.compile(r'\b(?:time|date|day|today|tonight|tomorrow|yesterday|now|current(?:ly)?|latest|weather|forecast|temperature|rain|snow|price|cost|worth|bitcoin|btc|stocks?|exchange|rate|score|sunrise|sunset|moon|tide|how much|until)\b', re.I)
+changing_pod = re.compile(r'time|date|weather|forecast|temperature|price|currency|exchange|stock|market|quote|sunrise|sunset|moon|tide', re.I)
+
+# Monthly queries per appid
+quota = 2000
 
 # Format a response as a table
 def table(text):
@@ -31,49 +63,177 @@ def jprint(data):
     print(json.dumps(data, indent=4, sort_keys=True))
 
 
-# Gets a plain-text answer
-def answer(subj, appid):
+# Opens the cache, falling back to memory if it can't be stored
+def store():
+    global db
+
+    if db is None:
+        try:
+            db = shelve.open(cache_file)
+        except Exception:
+            db = {}
+
+    return db
+
+
+# Normalizes a query for caching
+def normalize(subj):
+
+    subj = (' ').join(subj.lower().split())
+    return subj.rstrip('?!. ')
+
+
+# Returns the appid's quota entry for this month
+def usage(appid):
 
-    baseurl = 'http://api.wolframalpha.com/v2/query'
+    entry = store().get('quota:' + appid)
+    if entry is None or entry['month'] != time.strftime('%Y-%m'):
+        entry = { 'month' : time.strftime('%Y-%m'), 'calls' : 0 }
+
+    return entry
+
+
+# Returns False if the appid's monthly quota is used up
+def available(appid, limit):
+    with lock:
+        return usage(appid)['calls'] < limit
+
+
+# Counts an answered query against the appid's monthly quota
+def spend(appid):
+    with lock:
+        entry = usage(appid)
+        entry['calls'] += 1
+        store()['quota:' + appid] = entry
+        sync()
+
+
+# Writes the cache to disk
+def sync():
+    if hasattr(db, 'sync'):
+        db.sync()
+
+
+# Gets a plain-text answer, cached unless time-dependent
+def answer(subj, appid, limit=quota, expiry=ttl):
+
+    key = normalize(subj)
+    live = changing.search(subj) is not None
+
+    # Cached
+    if not live:
+        with lock:
+            entry = store().get(key)
+        if entry is not None and entry['expires'] > time.time():
+            return entry['result']
+
+    # Out of queries
+    if not available(appid, limit):
+        return
+
+    try:
+        (result, final) = query(subj, appid)
+    except (requests.exceptions.RequestException, etree.ParseError):
+        return
+
+    # Store
+    if final and not live and expiry > 0:
+        with lock:
+            store()[key] = { 'expires' : time.time() + expiry, 'result' : result }
+            sync()
+
+    return result
+
+
+# Queries the server
+# Returns the answer and whether it may be cached
+# Only queries the server answered count against the quota
+def query(subj, appid):
 
     parameters = {
-        'appid'       : appid,
-        'input'       : subj,
-        'podindex'    : '1,2',
-        'format'      : 'plaintext,image',
-        'units'       : 'nonmetric',
-        # 'scantimeout' : 1,
-        # 'parsetimeout': 1
+        'appid'        : appid,
+        'input'        : subj,
+        'podindex'     : '1,2',
+        'format'       : 'plaintext,image',
+        'units'        : 'nonmetric',
+        'totaltimeout' : query_timeout
     }
 
     # Query
-    resp = requests.get(baseurl, params=parameters)
-    if resp.status_code != requests.codes.ok:
-        return
-    data = xmltodict.parse(resp.text)['queryresult']
+    expires = time.time() + deadline
+    resp = http.get(baseurl, params=parameters, timeout=timeout, stream=True)
+    try:
+        if resp.status_code != requests.codes.ok:
+            return None, False
+        spend(appid)
+        resp.raw.decode_content = True
+        return parse(resp.raw, expires)
+    finally:
+        resp.close()
 
-    # Filter none-answers
-    if data['@success'] == 'false' or data['@numpods'] == '0' or '@nodata' in data.keys():
-        return
 
-    # Get Sources
-    if 'sources' in data.keys() and int(data['sources']['@count']):
-        sources = data['sources']['source']
-    else:
-        sources = None
+# Reads the title, answer and sources from a response
+# Stops reading once the second pod and any sources are in, or past the deadline
+# Answers from time-dependent pods may not be cached
+def parse(stream, expires=None):
 
-    # Get Title
-    title = data['pod'][0]['subpod']['plaintext']
-    title = re.sub(' \| ', ' ', title)
+    pods = []
+    sources = []
+    depth = 0
+    final = True
+
+    for (event, elem) in etree.iterparse(stream, events=('start', 'end')):
+
+        # Out of time
+        if expires is not None and time.time() > expires:
+            return None, False
+
+        if event == 'start':
+            depth += 1
 
-    # Get SubPod
-    data = data['pod'][1]['subpod']
-    if type(data) is list:
-        data = data[0]
+            # Filter none-answers
+            if elem.tag == 'queryresult':
+                if elem.get('error') == 'true':
+                    return None, False
+                if elem.get('success') == 'false' or elem.get('numpods') == '0' or elem.get('nodata') is not None:
+                    return None, True
+            continue
+
+        depth -= 1
+
+        # Get first subpod
+        if elem.tag == 'pod' and depth == 1:
+            if changing_pod.search(elem.get('id', '')) or changing.search(elem.get('title', '')):
+                final = False
+            subpod = elem.find('subpod')
+            if subpod is None:
+                return None, True
+            img = subpod.find('img')
+            pods.append({
+                'text' : subpod.findtext('plaintext'),
+                'img'  : img.get('src') if img is not None else None
+            })
+            elem.clear()
+
+        # Get Sources
+        elif elem.tag == 'sources' and depth == 1:
+            sources = [ { 'text' : x.get('text'), 'url' : x.get('url') } for x in elem.iter('source') ]
+            elem.clear()
+            if len(pods) >= 2:
+                break
+
+        elif elem.tag == 'queryresult':
+            break
+
+    if len(pods) < 2 or not pods[0]['text'] or not pods[1]['text']:
+        return None, True
+
+    # Get Title
+    title = re.sub(' \| ', ' ', pods[0]['text'])
 
     # Get Answer
-    text = data['plaintext']
-    img = data['img']['@src']
+    text = pods[1]['text']
+    img = pods[1]['img']
 
     # Format table
     if '\n' in text:
@@ -81,40 +241,51 @@ def answer(subj, appid):
     else:
         text = title + ': ' + text
 
-    return {'text' : text, 'img' : img, 'sources' : sources}
+    return {'text' : text, 'img' : img, 'sources' : sources}, final
+
 
+# Triggers
+question = re.compile(r'^(?:what|how)(?:\'?s)?\s+.+\?$', re.I)
+operators = re.compile(r'[\+\-/\*]')
+trigger = (question, operators)
 
 def main(bag, config):
 
     # Test for question 
-    if re.match(r'(?:what|how)(?:\'?s)?\s+.+\?$', bag['msg'], re.I):
+    if question.match(bag['msg']):
         pass
 
     # Test for operators
-    elif re.search(r'[\+\-/\*]', bag['msg']) and bag['addressed']:
+    elif operators.search(bag['msg']) and bag['addressed']:
         pass
 
     # Exit
     else:
         return
 
+    if 'wolfram_quota' in config.keys():
+        limit = int(config['wolfram_quota'])
+    else:
+        limit = quota
+
+    if 'wolfram_ttl' in config.keys():
+        expiry = int(config['wolfram_ttl'])
+    else:
+        expiry = ttl
+
     # Query Server
     subj = bag['msg']
     appid = config['wolframid']
-    result = answer(subj, appid)
+    result = answer(subj, appid, limit, expiry)
 
     if result is None:
         return
 
     # Compile Sources
-    if result['sources'] is not None:
-        if type(result['sources']) is list:
-            source = ('\n').join([ x['@text'] + ': ' + x['@url'] for x in result['sources']])
-        else:
-            x = result['sources']
-            source = x['@text'] + ': ' + x['@url']
+    if len(result['sources']):
+        source = ('\n').join([ x['text'] + ': ' + x['url'] for x in result['sources']])
     else:
         # Generate Clickable URL
         source = 'http://www.wolframalpha.com/input/?' + urllib.parse.urlencode({'i' : bag['msg']})
 
-    return {'msg' : result['text'], 'img' : result['img'], 'last' : {'response' : source}}
\ No newline at end of file
+    return {'msg' : result['text'], 'img' : result['img'], 'last' : {'response' : source}}
@@ -1,11 +1,14 @@
 # Your Mom
 # "Your MOM is..."
-# Version 1.0.2
+# Version 1.1.0
 import re
 
+# Trigger
+trigger = re.compile('^(.+)\s+is(?:\s+also)?\s+[^\?]+$', re.I|re.DOTALL)
+
 def main(bag, config):
 
-    match = re.match('(.+)\s+is(?:\s+also)?\s+[^\?]+$', bag['msg'], re.I|re.DOTALL)
+    match = trigger.match(bag['msg'])
     if match != None:
         msg = re.sub(re.escape(match.group(1)), 'Your mom', bag['msg'], 1)
         print('old:', match.group(1))
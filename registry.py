@@ -0,0 +1,299 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Plugin trigger registry
+# Plugins declare when they can respond with module level attributes:
+#   trigger   - compiled pattern, or a tuple of them, searched for in the message
+#   addressed - True if the plugin only responds when the bot is addressed
+# Plugins without a trigger run on every message
+# plugins/manifest.json is generated from those attributes so plugins can be
+# imported the first time they are called, with the import time recorded
+# Regenerate it after changing a trigger:  python registry.py
+# Check it is current:                     python registry.py --check
+# Offline and dev mode check it at startup and refuse to run if it is stale
+# Plugins missing from the manifest are imported up front to read them
+# Triggers anchored at the start are folded into one combined pattern
+# Triggers that can match anywhere are searched on their own, where re can
+# skip ahead to their literal prefixes
+
+import os
+import re
+import sys
+import json
+import time
+import importlib
+from util import log
+
+# Plugin directory and trigger manifest
+path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins')
+manifest = os.path.join(path, 'manifest.json')
+
+# name => module, once imported
+modules = {}
+
+# name => seconds spent importing
+timings = {}
+
+# name => [patterns]
+triggers = {}
+
+# name => addressed only
+addressed = {}
+
+# Plugin names in dispatch order
+order = []
+
+# Combined pattern and its group => name map
+matcher = None
+groupnames = {}
+
+# name => [patterns] searched on their own
+separate = {}
+
+# Inline flags that can be scoped to a group
+scoped = [ (re.I, 'i'), (re.M, 'm'), (re.S, 's') ]
+
+# Manifest flag letters
+letters = { 'i' : re.I, 'm' : re.M, 's' : re.S, 'x' : re.X }
+
+
+# Registers the plugins from their metadata
+# strict - imports every plugin and raises if the manifest is stale
+def build(mods, strict=False):
+    global order
+
+    triggers.clear()
+    addressed.clear()
+
+    # Stale manifest
+    if strict:
+        mismatched = check(mods)
+        if len(mismatched):
+            raise RuntimeError('Plugin manifest is stale for ' + ', '.join(mismatched) + ' - run python registry.py')
+
+    declared = read()
+
+    order = list(mods)
+    for mod in order:
+        info = declared.get(mod)
+
+        # Not declared - import to find out
+        if info is None:
+            log('Plugin "' + mod + '" not in manifest, importing')
+            info = vars(module(mod))
+
+        # Triggers
+        trigger = info.get('trigger', None)
+        if trigger is not None:
+            if type(trigger) not in (list, tuple):
+                trigger = [trigger]
+            triggers[mod] = list(trigger)
+
+        addressed[mod] = info.get('addressed', False)
+
+    combine()
+    log(str(len(triggers)) + " Plugin Trigger(s) Registered")
+
+
+# Reads the manifest
+# name => { 'trigger' : [compiled patterns], 'addressed' }
+def read():
+
+    try:
+        with open(manifest, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (IOError, ValueError) as err:
+        log('Plugin manifest unreadable -', err)
+        return {}
+
+    declared = {}
+    for mod, entry in entries.items():
+        info = { 'addressed' : entry.get('addressed', False) }
+        try:
+            if 'trigger' in entry:
+                info['trigger'] = [ re.compile(x['pattern'], sum([letters[y] for y in x.get('flags', '')])) for x in entry['trigger'] ]
+        except (re.error, KeyError, TypeError) as err:
+            log('Plugin "' + mod + '" manifest entry invalid -', err)
+            continue
+        declared[mod] = info
+
+    return declared
+
+
+# Returns the manifest entry for a plugin's own attributes
+def declare(plugin):
+
+    entry = {}
+
+    trigger = getattr(plugin, 'trigger', None)
+    if trigger is not None:
+        if type(trigger) not in (list, tuple):
+            trigger = [trigger]
+        entry['trigger'] = [ { 'flags' : ''.join([y for y in sorted(letters.keys()) if x.flags & letters[y]]), 'pattern' : x.pattern } for x in trigger ]
+
+    if getattr(plugin, 'addressed', False):
+        entry['addressed'] = True
+
+    return entry
+
+
+# Writes the manifest from the plugins' own attributes
+def generate(mods):
+
+    entries = dict([ (x, declare(module(x))) for x in mods ])
+    with open(manifest, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(entries, indent=4, sort_keys=True) + '\n')
+
+    log('Plugin manifest written for', len(entries), 'plugins')
+
+
+# Returns the plugins whose manifest entries differ from their own attributes
+def check(mods):
+
+    try:
+        with open(manifest, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (IOError, ValueError):
+        entries = {}
+
+    return [ x for x in sorted(mods) if x not in entries or entries[x] != declare(module(x)) ]
+
+
+# Returns a plugin module, importing it on first use
+def module(mod):
+
+    if mod not in modules:
+        start = time.time()
+        plugin = importlib.import_module('plugins.' + mod)
+
+        if mod not in timings:
+            timings[mod] = time.time() - start
+            log('Plugin "' + mod + '" imported in', round(timings[mod], 3), 'seconds')
+
+        # Manifest out of date
+        if mod in addressed and stale(mod, plugin):
+            log('Warning - plugin "' + mod + '" triggers differ from the manifest')
+
+        modules[mod] = plugin
+
+    return modules[mod]
+
+
+# Checks if a plugin's own triggers differ from those registered for it
+def stale(mod, plugin):
+
+    trigger = getattr(plugin, 'trigger', None)
+    if trigger is None:
+        trigger = []
+    elif type(trigger) not in (list, tuple):
+        trigger = [trigger]
+
+    declared = [(x.pattern, x.flags) for x in triggers.get(mod, [])]
+    return [(x.pattern, x.flags) for x in trigger] != declared or getattr(plugin, 'addressed', False) != addressed[mod]
+
+
+# Folds the anchored triggers into one pattern
+# Each becomes an optional lookahead at the start that records if it matched
+def combine():
+    global matcher
+
+    matcher = None
+    groupnames.clear()
+    separate.clear()
+
+    parts = []
+    for mod in order:
+        for trigger in triggers.get(mod, []):
+            part = wrap(trigger) if anchored(trigger) else None
+
+            # Search on its own
+            if part is None:
+                separate.setdefault(mod, []).append(trigger)
+                continue
+
+            group = '_t' + str(len(groupnames))
+            groupnames[group] = mod
+            parts.append('(?:(?=(?P<' + group + '>' + part + '))|)')
+
+    if not len(parts):
+        return
+
+    try:
+        matcher = re.compile(''.join(parts))
+    except re.error as err:
+        log('Plugin triggers could not be combined -', err)
+        for mod in set(groupnames.values()):
+            separate.setdefault(mod, []).extend([x for x in triggers[mod] if anchored(x)])
+        groupnames.clear()
+
+
+# Returns a trigger's pattern with its flags scoped to it
+# None if the pattern can't be embedded in the combined pattern
+def wrap(trigger):
+
+    # Bytes, verbose or numbered back references
+    if type(trigger.pattern) is not str or trigger.flags & re.X or re.search(r'\\[1-9]', trigger.pattern):
+        return None
+
+    on = ''.join([y for x, y in scoped if trigger.flags & x])
+    off = ''.join([y for x, y in scoped if not trigger.flags & x])
+    return '(?' + on + '-' + off + ':' + trigger.pattern + ')'
+
+
+# Checks if a trigger only matches at the start of the message
+def anchored(trigger):
+    return trigger.pattern.startswith('^') and not trigger.flags & re.M
+
+
+# Returns the names of the plugins whose triggers fire on a message
+def fired(msg):
+
+    names = set()
+
+    if matcher is not None:
+        match = matcher.match(msg)
+        names.update([mod for group, mod in groupnames.items() if match.group(group) is not None])
+
+    for mod, patterns in separate.items():
+        if mod not in names and any([x.search(msg) for x in patterns]):
+            names.add(mod)
+
+    return names
+
+
+# Returns the plugins to call for a message, in dispatch order
+def select(bag):
+
+    names = fired(bag['msg'])
+    return [x for x in order if (x not in triggers or x in names) and (bag['addressed'] or not addressed[x])]
+
+
+# Regenerates or checks the manifest
+if __name__ == '__main__':
+    import plugins
+    names = [x for x in plugins.__all__ if x != '__init__']
+
+    if '--check' in sys.argv[1:]:
+        mismatched = check(names)
+        if len(mismatched):
+            print('Plugin manifest is stale for', ', '.join(mismatched))
+            sys.exit(1)
+        print('Plugin manifest is current')
+    else:
+        generate(names)
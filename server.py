@@ -18,8 +18,14 @@
 
 import os
 import json
+import signal
+import threading
 import brick
+import groups
+import ingest
+import activity
 from util import log
+from settings import code
 
 try:
   from http.server import CGIHTTPRequestHandler
@@ -27,12 +33,39 @@ try:
 except ImportError:
   from http.server import CGIHTTPRequestHandler
   from http.server import HTTPServer as Server
+  from http.server import ThreadingHTTPServer
 
 # Read port selected by the cloud for the application
 PORT = int(os.getenv('PORT', 8000))
 # Change current directory to avoid exposure of control files
 # os.chdir('static')
 
+# Threaded server - limits the number of requests handled at once
+class ThreadedServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, limit):
+        ThreadingHTTPServer.__init__(self, address, handler)
+        self.slots = threading.BoundedSemaphore(limit)
+
+    # Wait for a free slot before starting a request thread
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        try:
+            ThreadingHTTPServer.process_request(self, request, client_address)
+        except:
+            self.slots.release()
+            raise
+
+    # Release the slot once the request is finished
+    def process_request_thread(self, request, client_address):
+        try:
+            ThreadingHTTPServer.process_request_thread(self, request, client_address)
+        finally:
+            self.slots.release()
+
+
 # Subclass Request Handler
 class Handler(CGIHTTPRequestHandler):
 
@@ -66,20 +99,69 @@ class Handler(CGIHTTPRequestHandler):
     def do_POST(self):
         content_len = int(self.headers.get('content-length'))
         post_body = self.rfile.read(content_len)
-        self.send_response(200)
-        self.end_headers()
 
         # Convert to JSON
         body = post_body.decode("utf-8", "replace")
-        data = json.loads(body)
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+
+        # Invalid message
+        if type(data) is not dict:
+            log('Invalid POST body received')
+            self.send_response(400)
+            self.end_headers()
+            return
+
+        # Queue message and acknowledge immediately
+        if brick.config['ingest_async']:
+            resp = ingest.push(data, brick.config['queue_depth'], brick.config['queue_overflow'])
+
+            # Unknown group
+            if resp['code'] == code['missing']:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            if resp['code'] != code['success']:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.end_headers()
         brick.handler(data)
         return
 
 
-httpd = Server(("", PORT), Handler)
+# Stop serving on SIGTERM - Heroku stops dynos with it, which skips atexit
+def terminate(signum, frame):
+  raise SystemExit(0)
+
+
+# Start queue workers - at least one per group
+ingest.start(brick.handler, max(brick.config['ingest_workers'], len(groups.shards)))
+
+# Select server mode
+if brick.config['server_threads'] > 0:
+  httpd = ThreadedServer(("", PORT), Handler, brick.config['server_threads'])
+  log("Serving with up to %i threads" % brick.config['server_threads'])
+else:
+  httpd = Server(("", PORT), Handler)
+
+signal.signal(signal.SIGTERM, terminate)
+
 try:
   log("Start serving at port %i" % PORT)
   httpd.serve_forever()
-except KeyboardInterrupt:
+except (KeyboardInterrupt, SystemExit):
   pass
-httpd.server_close()
\ No newline at end of file
+httpd.server_close()
+
+# Save buffered user activity
+activity.flush()
\ No newline at end of file
@@ -109,6 +109,16 @@ defaults = {
         'type'     : str,
         'hidden'   : True
         },
+    'db_backend'   : {
+        'val'      : 'cloudant',
+        'type'     : str,
+        'hidden'   : True
+        },
+    'db_path'      : {
+        'val'      : None,
+        'type'     : str,
+        'hidden'   : True
+        },
     'db_url'       : {
         'val'      : None,
         'type'     : str,
@@ -173,7 +183,102 @@ defaults = {
         'val'      : 24,
         'type'     : int,
         'hidden'   : False
-    }
+    },
+    'ingest_async' : {
+        'val'      : False,
+        'type'     : bool,
+        'hidden'   : True
+        },
+    'ingest_workers' : {
+        'val'      : 1,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'queue_depth'  : {
+        'val'      : 100,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'queue_overflow' : {
+        'val'      : 'drop',
+        'type'     : str,
+        'hidden'   : True
+        },
+    'server_threads' : {
+        'val'      : 0,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'multigroup'   : {
+        'val'      : False,
+        'type'     : bool,
+        'hidden'   : True
+        },
+    'http_pool_size' : {
+        'val'      : 10,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'http_retries' : {
+        'val'      : 3,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'http_connect_timeout' : {
+        'val'      : 5,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'http_read_timeout' : {
+        'val'      : 15,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'post_window'  : {
+        'val'      : 2,
+        'type'     : int,
+        'hidden'   : False
+        },
+    'fact_index'   : {
+        'val'      : True,
+        'type'     : bool,
+        'hidden'   : True
+        },
+    'follow_changes' : {
+        'val'      : True,
+        'type'     : bool,
+        'hidden'   : True
+        },
+    'stats_reconcile' : {
+        'val'      : 3600,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'user_flush'   : {
+        'val'      : 60,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'state_debounce' : {
+        'val'      : 30,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'plugin_workers' : {
+        'val'      : 8,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'plugin_timeout' : {
+        'val'      : 8,
+        'type'     : int,
+        'hidden'   : True
+        },
+    'plugin_budget' : {
+        'val'      : 12,
+        'type'     : int,
+        'hidden'   : True
+        }
 }
 
 def load_config():
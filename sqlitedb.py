@@ -0,0 +1,274 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Local SQLite storage backend
+# Stores docs as JSON with indexed columns and emulates the design doc views
+# and the factoids search index used by brickdb
+
+import re
+import json
+import uuid
+import sqlite3
+import threading
+from settings import code
+from util import depunctuate, log
+
+db = None
+fts = False
+lock = threading.RLock()
+
+
+# Returns the value emitted for a cached factoid
+def cached_value(doc):
+    if doc['mode'] == '<reply>':
+        return doc['factoid']
+    return doc['subject'] + ' ' + doc['mode'][1:-1] + ' ' + doc['factoid']
+
+
+# Emulated views of the 'main' design doc
+views = {
+    'subjects'       : { 'where' : "kind = 'fact'", 'key' : 'subject_lc' },
+    'nonalias'       : { 'where' : "kind = 'fact' AND mode != '<alias>'", 'key' : 'subject_lc' },
+    'nonalias_count' : { 'where' : "kind = 'fact' AND mode != '<alias>'", 'key' : 'subject_lc', 'reduce' : True },
+    'cached'         : { 'where' : "kind = 'fact' AND mode != '<alias>' AND cached = 1", 'key' : 'subject_lc', 'value' : cached_value },
+    'vars'           : { 'where' : "kind = 'var'", 'key' : 'var', 'value' : lambda doc: doc['value'] },
+    'users'          : { 'where' : "kind = 'user'", 'key' : 'grp' },
+    'states'         : { 'where' : "kind = 'state'", 'key' : 'grp' },
+    'syllables'      : { 'where' : "kind = 'syllables'", 'key' : 'subject_lc', 'value' : lambda doc: doc['syllables'] }
+}
+
+# Search fields => FTS columns
+fields = { 'fact' : 'fact', 'factoid' : 'fact', 'subject' : 'subject' }
+
+
+# Opens the database file and creates the tables
+def initialize(path):
+    global db, fts
+
+    with lock:
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('''CREATE TABLE IF NOT EXISTS docs (
+                        id         TEXT PRIMARY KEY,
+                        rev        TEXT NOT NULL,
+                        kind       TEXT,
+                        subject_lc TEXT,
+                        var        TEXT,
+                        cached     INTEGER,
+                        user_id    TEXT,
+                        grp        TEXT,
+                        mode       TEXT,
+                        body       TEXT NOT NULL )''')
+        for column in ('subject_lc', 'var', 'cached', 'user_id', 'grp', 'kind'):
+            db.execute('CREATE INDEX IF NOT EXISTS docs_{0} ON docs ({0})'.format(column))
+
+        # Full text search
+        try:
+            db.execute('CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(id UNINDEXED, subject, fact)')
+            fts = True
+        except sqlite3.OperationalError:
+            log('FTS5 not available - searching without an index')
+            fts = False
+
+        db.commit()
+
+    log("Opened local database", repr(path))
+    return { 'code' : code['success'], 'url' : path, 'seq' : None }
+
+
+# Returns the kind of a doc
+def kind(doc):
+    if 'subject_lc' in doc and 'mode' in doc and 'factoid' in doc:
+        return 'fact'
+    if 'var' in doc and 'value' in doc:
+        return 'var'
+    if 'user_id' in doc:
+        return 'user'
+    if 'config' in doc and 'version' in doc:
+        return 'state'
+    if 'syllables' in doc and 'subject' in doc:
+        return 'syllables'
+    return None
+
+
+# Returns the indexed columns of a doc
+def columns(doc):
+
+    subj = doc.get('subject_lc')
+    if subj is None and 'syllables' in doc and 'subject' in doc:
+        subj = depunctuate(doc['subject'])
+
+    return (
+        kind(doc),
+        subj,
+        doc.get('var'),
+        1 if doc.get('cached') else 0,
+        doc.get('user_id'),
+        doc.get('group'),
+        doc.get('mode')
+    )
+
+
+# Returns rows or docs for an emulated view
+def view(design, dbview, include_docs=False, payload=None, limit=None, skip=None, group=None, group_level=None):
+
+    # Unknown view
+    if dbview not in views:
+        log("Database query failed - unknown view " + repr(dbview))
+        return { 'code' : code['failed'] }
+    v = views[dbview]
+
+    # Filter
+    sql = 'SELECT id, body, ' + v['key'] + ' FROM docs WHERE ' + v['where']
+    params = []
+    if payload is not None and 'keys' in payload:
+        sql += ' AND ' + v['key'] + ' IN (' + ','.join('?' * len(payload['keys'])) + ')'
+        params += payload['keys']
+    sql += ' ORDER BY ' + v['key'] + ', id'
+
+    # Reduce - counts rows
+    if v.get('reduce'):
+        with lock:
+            rows = db.execute(sql.replace('id, body, ', '', 1), params).fetchall()
+        if group:
+            counts = {}
+            for row in rows:
+                counts[row[0]] = counts.get(row[0], 0) + 1
+            result = [ { 'key' : x, 'value' : counts[x] } for x in sorted(counts.keys(), key=str) ]
+
+        # No rows reduce to nothing, as in CouchDB
+        elif len(rows):
+            result = [ { 'key' : None, 'value' : len(rows) } ]
+        else:
+            result = []
+        return { 'code' : code['success'], 'result' : result }
+
+    # Paging
+    if limit or skip:
+        sql += ' LIMIT ? OFFSET ?'
+        params += [limit if limit else -1, skip if skip else 0]
+
+    with lock:
+        rows = db.execute(sql, params).fetchall()
+
+    # Docs
+    docs = [ json.loads(x[1]) for x in rows ]
+    if include_docs:
+        return { 'code' : code['success'], 'result' : docs }
+
+    # Rows
+    value = v.get('value', lambda doc: None)
+    result = [ { 'id' : x[0], 'key' : x[2], 'value' : value(doc) } for x, doc in zip(rows, docs) ]
+    return { 'code' : code['success'], 'result' : result }
+
+
+# Performs a search for values in a given field
+def search(index, field, value):
+
+    words = re.findall('\w+', value)
+    if not len(words):
+        return { 'code' : code['success'], 'result' : [] }
+    column = fields.get(field, 'fact')
+
+    with lock:
+
+        # Full text index
+        if fts:
+            query = ' AND '.join([ column + ' : "' + x + '"' for x in words ])
+            rows = db.execute('SELECT docs.body FROM search JOIN docs ON docs.id = search.id WHERE search MATCH ? ORDER BY rank', (query,)).fetchall()
+            result = [ json.loads(x[0]) for x in rows ]
+
+        # Scan
+        else:
+            key = 'factoid' if column == 'fact' else 'subject'
+            rows = db.execute("SELECT body FROM docs WHERE kind = 'fact'").fetchall()
+            result = [ json.loads(x[0]) for x in rows ]
+            result = [ x for x in result if all([ w.lower() in x[key].lower() for w in words ]) ]
+
+    return { 'code' : code['success'], 'result' : result }
+
+
+# Adds, updates or deletes docs
+# Returns a row per doc like _bulk_docs
+def post_docs(docs):
+
+    result = []
+    with lock:
+        for doc in docs:
+            docid = doc.get('_id', uuid.uuid4().hex)
+            row = db.execute('SELECT rev FROM docs WHERE id = ?', (docid,)).fetchone()
+
+            # Conflict
+            if (row is None and '_rev' in doc) or (row is not None and doc.get('_rev') != row[0]):
+                log("Warning - database error! -", 'Document update conflict.')
+                result.append({ 'id' : docid, 'error' : 'conflict', 'reason' : 'Document update conflict.', 'code' : code['failed'] })
+                continue
+
+            # New revision
+            count = int(row[0].split('-')[0]) if row is not None else 0
+            rev = str(count + 1) + '-' + uuid.uuid4().hex
+
+            # Delete
+            if fts:
+                db.execute('DELETE FROM search WHERE id = ?', (docid,))
+            if doc.get('_deleted'):
+                db.execute('DELETE FROM docs WHERE id = ?', (docid,))
+                result.append({ 'ok' : True, 'id' : docid, 'rev' : rev, 'code' : code['success'] })
+                continue
+
+            # Store
+            stored = dict(doc)
+            stored['_id'] = docid
+            stored['_rev'] = rev
+            db.execute('INSERT OR REPLACE INTO docs (kind, subject_lc, var, cached, user_id, grp, mode, id, rev, body) VALUES (?,?,?,?,?,?,?,?,?,?)',
+                        columns(stored) + (docid, rev, json.dumps(stored)))
+            if fts and kind(stored) == 'fact':
+                db.execute('INSERT INTO search (id, subject, fact) VALUES (?,?,?)', (docid, stored['subject'], stored['factoid']))
+
+            result.append({ 'ok' : True, 'id' : docid, 'rev' : rev, 'code' : code['success'] })
+
+        db.commit()
+
+    return { 'code' : code['success'], 'result' : result }
+
+
+# Return a document with the provided ID
+# Returns in the format provided
+def fetch(doc_ids):
+
+    if type(doc_ids) != list:
+        single = True
+        doc_ids = [doc_ids]
+    else:
+        single = False
+
+    docs = []
+    with lock:
+        for x in doc_ids:
+            row = db.execute('SELECT body FROM docs WHERE id = ?', (x,)).fetchone()
+            if row is None:
+                log("Database query failed - 404: missing")
+                docs.append({ 'code' : code['failed'] })
+            else:
+                docs.append({ 'code' : code['success'], 'result' : json.loads(row[0]) })
+
+    if single:
+        return docs[0]
+    else:
+        return docs
@@ -0,0 +1,127 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# In-memory statistics for /status and the stats command
+# Fact and subject totals come from the factoid index, which write paths
+# keep current, and are reconciled against the database views periodically
+# With the index off they come from the views, queried again on the first
+# read after a fact is written or removed
+
+import time
+import threading
+import brickdb
+import factoids
+from settings import code
+from util import log
+
+# Totals from the last reconcile - used when the factoid index is off
+counts = { 'facts' : 0, 'subjects' : 0 }
+reconciled = 0
+dirty = False
+
+# plugin => { 'calls', 'responses', 'errors' }
+plugins = {}
+
+lock = threading.Lock()
+
+
+# Returns the number of known facts
+def facts():
+    if factoids.loaded:
+        return factoids.totals()[0]
+    if dirty:
+        reconcile(force=True)
+    return counts['facts']
+
+
+# Returns the number of known subjects
+def subjects():
+    if factoids.loaded:
+        return factoids.totals()[1]
+    if dirty:
+        reconcile(force=True)
+    return counts['subjects']
+
+
+# Marks the totals out of date when facts are written or removed
+# Deletions from the change feed only carry an ID, so any deletion counts
+def apply(docs):
+    global dirty
+
+    if any([factoids.isfact(x) or x.get('_deleted') for x in docs]):
+        with lock:
+            dirty = True
+
+
+# Increments a plugin counter
+def plugin(mod, key):
+    with lock:
+        entry = plugins.setdefault(mod, { 'calls' : 0, 'responses' : 0, 'errors' : 0, 'timeouts' : 0 })
+        entry[key] += 1
+
+
+# Returns a copy of the plugin counters
+def plugin_counts():
+    with lock:
+        return dict([ (x, dict(plugins[x])) for x in plugins.keys() ])
+
+
+# Compares the totals with the database views
+# Runs at most once per interval unless forced
+def reconcile(interval=0, force=False):
+    global reconciled, dirty
+
+    now = time.time()
+    with lock:
+        if not force and now - reconciled < interval:
+            return { 'code' : code['success'] }
+        reconciled = now
+        dirty = False
+
+    # Count facts and subjects
+    resp = brickdb.query('nonalias_count')
+    if resp['code'] != code['success']:
+        log('Statistics reconcile failed!')
+        with lock:
+            dirty = True
+        return { 'code' : code['failed'] }
+
+    # Empty database - no reduce rows
+    if len(resp['result']):
+        total = resp['result'][0]['value']
+    else:
+        total = 0
+
+    resp = brickdb.query('nonalias_count', group=True, group_level=1)
+    if resp['code'] != code['success']:
+        log('Statistics reconcile failed!')
+        with lock:
+            dirty = True
+        return { 'code' : code['failed'] }
+    subj = len(resp['result'])
+
+    counts['facts'] = total
+    counts['subjects'] = subj
+
+    # Rebuild the index if it has drifted
+    if factoids.loaded and factoids.totals() != (total, subj):
+        log('Factoid index out of sync -', factoids.totals(), '!=', (total, subj))
+        factoids.load()
+
+    return { 'code' : code['success'] }
@@ -16,76 +16,253 @@
 # You should have received a copy of the GNU General Public License
 # along with Brick.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import re
-from nltk.corpus import cmudict
+import mmap
+import time
+import array
+import bisect
+import struct
+import hashlib
+import functools
+import threading
+from util import log
 
 # Initialize nltk - cmudict
 # import nltk
 # nltk.download()
 
-# Dictionary
-d = cmudict.dict()
+# CMU pronouncing dictionary and its compiled syllable table
+source = 'lib/nltk_data/corpora/cmudict/cmudict'
+compiled = 'lib/cmudict.bin'
+
+# Table layout - header, word offsets, syllable counts, sorted words
+magic = b'BRKSYL1\n'
+header = struct.Struct('<8s20sI')
+
+# Words per block of the in-memory index
+block = 64
+
+# Dictionary - word => syllables of its first pronunciation, loaded on first use
+d = None
+loading = threading.Lock()
 
 # Syllable cache
 syllcache = {}
 
+# Words with counts kept in memory
+cache_size = 8192
+
+# Message normalization
+special = re.compile(r'[\d<>&\-]|\.(?:com|org|net|info|biz|us)|www\.')
+digit = re.compile(r'\d')
+letter_digit = re.compile(r'(?<=[a-zA-Z])(?=\d)|(?<=\d)(?=[a-zA-Z])')
+dates = re.compile(r'\b(1[89]|20)(\d\d)\b')
+comma_number = re.compile(r',(\d\d\d)')
+greater = re.compile(r'([a-zA-Z\d ])>([a-zA-Z\d ])')
+less = re.compile(r'([a-zA-Z\d ])<([a-zA-Z\d ])')
+web_punctuation = re.compile(r'\.(com|org|net|info|biz|us)|www\.|[:,\/\*.!?]')
+punctuation = re.compile(r'[:,\/\*.!?]')
+ampersand = re.compile(r'\b(\w+)&(\w+)\b')
+hyphen = re.compile(r'-(\D|$)')
+
+# Word rules
+single_letter = re.compile(r'([a-z])\1*$')
+consonants = re.compile(r'[bcdfghjklmnpqrstvwxz]+$')
+whole_number = re.compile(r'[0-9]+$')
+negative_number = re.compile(r'-[0-9]+$')
+vowel = re.compile(r'[eaoui]')
+vowel_pair = re.compile(r'[eaoui][eaoui]')
+vowel_triple = re.compile(r'[eaoui][eaoui][eaoui]')
+vowel_consonant = re.compile(r'[eaoui][^eaoui]')
+
+# Sorted word => syllable count table over a buffer
+class table:
+
+    def __init__(self, buf):
+        (mark, digest, size) = header.unpack_from(buf, 0)
+        view = memoryview(buf)
+
+        self.buf = buf
+        self.size = size
+        self.digest = digest
+
+        start = header.size
+        self.offsets = view[start : start + 4 * (size + 1)].cast('I')
+        start += 4 * (size + 1)
+        self.counts = view[start : start + size]
+        self.words = start + size
+
+        # First word of each block
+        self.index = [self[x] for x in range(0, size, block)]
+
+    def __len__(self):
+        return self.size
+
+    # Word at a position, for bisect
+    def __getitem__(self, i):
+        return self.buf[self.words + self.offsets[i] : self.words + self.offsets[i + 1]]
+
+    # Returns the syllable count of a word, None if unknown
+    def get(self, word):
+        key = word.encode('utf-8')
+        lo = max(bisect.bisect_right(self.index, key) - 1, 0) * block
+        i = bisect.bisect_left(self, key, lo, min(lo + block, self.size))
+        if i < self.size and self[i] == key:
+            return self.counts[i]
+        return None
+
+# Loads the syllable table
+def load():
+    global d
+
+    if d is None:
+        with loading:
+            if d is None:
+                start = time.time()
+                d = open_table()
+                log('Syllable dictionary loaded in', round(time.time() - start, 3), 'seconds')
+
+    return d
+
+# Opens the compiled table, rebuilding it when the dictionary has changed
+def open_table():
+
+    # No dictionary source - fall back to nltk
+    if not os.path.exists(source):
+        from nltk.corpus import cmudict
+        return { x : [len([z for z in y if z[-1].isdigit()]) for y in p][0] for x, p in cmudict.dict().items() }
+
+    with open(source, 'rb') as f:
+        text = f.read()
+    digest = hashlib.sha1(text).digest()
+
+    # Current table
+    try:
+        with open(compiled, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buf[:len(magic)] == magic and header.unpack_from(buf, 0)[1] == digest:
+            return table(buf)
+        buf.close()
+    except (IOError, OSError, ValueError, struct.error):
+        pass
+
+    # Rebuild
+    data = build(text, digest)
+    try:
+        with open(compiled + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(compiled + '.tmp', compiled)
+        log('Syllable table rebuilt')
+    except (IOError, OSError):
+        log('Syllable table could not be saved, keeping it in memory')
+
+    return table(data)
+
+# Compiles the dictionary text into a table
+# Counts the stress marks of each word's first pronunciation like nltk's reader
+def build(text, digest):
+
+    counts = {}
+    for line in text.splitlines():
+        pieces = line.split()
+        if not len(pieces):
+            continue
+        word = pieces[0].decode('utf-8').lower().encode('utf-8')
+        if word not in counts:
+            counts[word] = len([x for x in pieces[2:] if x[-1:].isdigit()])
+
+    words = sorted(counts.keys())
+    offsets = array.array('I', [0])
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+
+    return b''.join([
+        header.pack(magic, digest, len(words)),
+        offsets.tobytes(),
+        bytes([min(counts[x], 255) for x in words]),
+        b''.join(words)
+    ])
+
 # Returns the number of syllables in a string
 def find(msg):
 
     # Strip Case
     msg = msg.lower()
 
-    # Add Space to CamelCased words
-    msg = re.sub(r'([a-z])([A-Z])', '\g<1> \g<2>', msg)
+    # Plain text only needs punctuation removed
+    if special.search(msg):
+        msg = normalize(msg)
+    else:
+        msg = punctuation.sub(' ', msg)
+
+    # Break into words
+    words = word_split(msg)
+
+    # Count the syllables
+    return sum([word_syll(x) for x in words])
+
+# Spells out numbers, symbols and web addresses
+def normalize(msg):
+
+    if digit.search(msg):
 
-    # Seperate Numbers
-    msg = re.sub(r'([a-zA-Z])(\d)', '\g<1> \g<2>', msg)
-    msg = re.sub(r'(\d)([a-zA-Z])', '\g<1> \g<2>', msg)
+        # Seperate Numbers
+        msg = letter_digit.sub(' ', msg)
 
-    # Dates
-    msg = re.sub(r'\b(1[89]|20)(\d\d)\b', '\g<1> \g<2>', msg)
+        # Dates
+        msg = dates.sub('\g<1> \g<2>', msg)
 
-    # Comma-form numbers
-    msg = re.sub(r',(\d\d\d)', '\g<1>', msg)
+        # Comma-form numbers
+        msg = comma_number.sub('\g<1>', msg)
 
     # Greater/Less Than
-    msg = re.sub(r'([a-zA-Z\d ])>([a-zA-Z\d ])', '\g<1> greater than \g<2>', msg)
-    msg = re.sub(r'([a-zA-Z\d ])<([a-zA-Z\d ])', '\g<1> less than \g<2>', msg)
+    if '>' in msg:
+        msg = greater.sub('\g<1> greater than \g<2>', msg)
+    if '<' in msg:
+        msg = less.sub('\g<1> less than \g<2>', msg)
 
     # Punctuation
-    msg = re.sub(r'\.(com|org|net|info|biz|us)', ' dot \g<1>', msg)
-    msg = re.sub(r'www\.', 'www dot ', msg)
-    msg = re.sub(r'[:,\/\*.!?]',' ',msg)
-
-    # at&t
-    while True:
-        match = re.search(r'(?:\b|^)(\w+)&(\w+)(?:\b|$)', msg)
-        if match is None:
+    msg = web_punctuation.sub(web_word, msg)
+
+    # at&t - until every word&word is spelled out
+    while '&' in msg:
+        spelled = ampersand.sub(amp_words, msg)
+        if spelled == msg:
             break
+        msg = spelled
 
-        
-        (first, last) = match.group(1, 2)
-
-        # Seperate as Letters
-        if (len(first) + len(last) < 6 ):
-            (newfirst, newlast) = ( (' ').join(x) for x in (first, last) )
-            msg = re.sub('(?:^|\b)' + first + '&' + last + '(?:\b|$)', newfirst + ' and ' + newlast, msg)
-        
-        # Seperate as words
-        else:
-            msg = re.sub('(?:^|\b)' + first + '&' + last + '(?:\b|$)', first + ' and ' + last, msg)       
-    
-    msg = re.sub('&', 'and', msg)
+    msg = msg.replace('&', 'and')
 
     # Hyphens
-    msg = re.sub(r'-(\D|$)', ' \g<1>', msg)
+    if '-' in msg:
+        msg = hyphen.sub(' \g<1>', msg)
 
-    # Break into words
-    syll = 0
-    words = word_split(msg)
+    return msg
 
-    # Count the syllables
-    return sum([word_syll(x) for x in words])
+# Replacement for web punctuation
+def web_word(match):
+
+    # .com, .org...
+    if match.group(1):
+        return ' dot ' + match.group(1)
+
+    # www.
+    if match.group(0) == 'www.':
+        return 'www dot '
+
+    return ' '
+
+# Replacement for word&word
+def amp_words(match):
+    (first, last) = match.group(1, 2)
+
+    # Seperate as Letters
+    if len(first) + len(last) < 6:
+        return (' ').join(first) + ' and ' + (' ').join(last)
+
+    # Seperate as words
+    return first + ' and ' + last
 
 # Returns words in a string
 def word_split(txt):
@@ -98,36 +275,45 @@ def word_syll(word):
     # Remove casing
     word = word.lower()
 
+    (count, fixed) = estimate(word)
+
+    # Check cheat sheet
+    if not fixed and word in syllcache:
+        return syllcache[word]
+
+    return count
+
+# Returns the syllables for a word without the cheat sheet
+# and whether the cheat sheet may override them
+@functools.lru_cache(maxsize=cache_size)
+def estimate(word):
+
     # String of a single letters
-    if re.match(r'([a-z])\1*$', word):
-        if re.match('[aeiou]', word):
-            return 1
-        elif re.match('w', word):
-            return 3 * len(word)
+    if single_letter.match(word):
+        if word[0] in 'aeiou':
+            return (1, True)
+        elif word[0] == 'w':
+            return (3 * len(word), True)
         else:
-            return len(word)
+            return (len(word), True)
 
     # Acronyms
-    if re.match('[bcdfghjklmnpqrstvwxz]+$', word):
-        return len(word) + 2 * word.count('w')
+    if consonants.match(word):
+        return (len(word) + 2 * word.count('w'), True)
 
     # Numbers
-    if re.match('[0-9]+$', word):
-        return number(word)
-    elif re.match('-[0-9]+$', word):
-        re.sub('-', '', word)
-        return number(word) + 2
-
-    # Check cheat sheet
-    if word in syllcache.keys():
-        return syllcache[word]
+    if whole_number.match(word):
+        return (number(word), True)
+    elif negative_number.match(word):
+        return (number(word[1:]) + 2, True)
 
     # Check dictionary
-    if word in d.keys():
-        return [len(list(y for y in x if y[-1].isdigit())) for x in d[word]][0]
+    count = load().get(word)
+    if count is not None:
+        return (count, False)
 
     # Calculate Syllables
-    return calc(word)
+    return (calc(word), False)
 
 # Algorithmically determines syllable count
 def calc(word):
@@ -136,7 +322,7 @@ def calc(word):
     word = word.lower()
 
     # Apostrophe
-    word = re.sub('\'','',word)
+    word = word.replace('\'', '')
  
     # Rule Arrays
     co_one = ['cool','coach','coat','coal','count','coin','coarse','coup','coif','cook','coign','coiffe','coof','court']
@@ -154,8 +340,8 @@ def calc(word):
     # If doesn't end with "ted" or "tes" or "ses" or "ied" or "ies", discard "es" and "ed" at the end.
     # If it has only 1 vowel or 1 set of consecutive vowels, discard. (like "speed", "fled" etc.)
     if word[-2:] == "es" or word[-2:] == "ed" :
-        doubleAndtripple_1 = len(re.findall(r'[eaoui][eaoui]',word))
-        if doubleAndtripple_1 > 1 or len(re.findall(r'[eaoui][^eaoui]',word)) > 1 :
+        doubleAndtripple_1 = len(vowel_pair.findall(word))
+        if doubleAndtripple_1 > 1 or len(vowel_consonant.findall(word)) > 1 :
             if word[-3:] == "ted" or word[-3:] == "tes" or word[-3:] == "ses" or word[-3:] == "ied" or word[-3:] == "ies" :
                 pass
             else :
@@ -170,12 +356,12 @@ def calc(word):
             disc+=1
  
     # Count vowel pairs and triplets as 1
-    doubleAndtripple = len(re.findall(r'[eaoui][eaoui]',word))
-    tripple = len(re.findall(r'[eaoui][eaoui][eaoui]',word))
+    doubleAndtripple = len(vowel_pair.findall(word))
+    tripple = len(vowel_triple.findall(word))
     disc+=doubleAndtripple + tripple
  
     # Count remaining vowels
-    numVowels = len(re.findall(r'[eaoui]',word))
+    numVowels = len(vowel.findall(word))
  
     # Add 1 if starts with "mc"
     if word[:2] == "mc" :
@@ -0,0 +1,128 @@
+# Brick is a modular and expandable chat-bot capable of basic learning and information fetching by API calls.
+# Copyright (C) 2015  Bill Ballou
+
+# This file is part of Brick.
+
+# Brick is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+
+# Brick is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Brick.  If not, see <http://www.gnu.org/licenses/>.
+
+# Shared HTTP transport
+# Pooled keep-alive connections with default timeouts and retries on 5xx/429
+# Only idempotent requests are retried once sent - a resent POST could
+# duplicate a chat post or a document
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+# Retry settings
+backoff = 0.5
+status_retry = (429, 500, 502, 503, 504)
+methods = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+
+adapters = []
+counts = { 'retries' : 0, 'timeouts' : 0 }
+counting = threading.Lock()
+
+
+# Retry policy that counts retries
+class retry(Retry):
+
+    def increment(self, *args, **kwargs):
+        count('retries')
+        return Retry.increment(self, *args, **kwargs)
+
+
+# Session with a default timeout
+class session(requests.Session):
+
+    timeout = None
+
+    def request(self, method, url, **kwargs):
+
+        # Default timeout
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+
+        try:
+            return requests.Session.request(self, method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            count('timeouts')
+            raise
+
+
+# Shared session
+http = session()
+
+
+# Increments a counter
+def count(key):
+    with counting:
+        counts[key] += 1
+
+
+# Applies pool, retry and timeout settings to a session
+def configure(config, interface=None):
+
+    if interface is None:
+        interface = http
+
+    # Retry policy
+    params = {
+        'total'                      : config['http_retries'],
+        'read'                       : config['http_retries'],
+        'connect'                    : config['http_retries'],
+        'status'                     : config['http_retries'],
+        'backoff_factor'             : backoff,
+        'status_forcelist'           : status_retry,
+        'raise_on_status'            : False,
+        'respect_retry_after_header' : True
+    }
+    try:
+        policy = retry(allowed_methods=methods, **params)
+    except TypeError:
+        policy = retry(method_whitelist=methods, **params)
+
+    # Connection pools
+    adapter = HTTPAdapter(pool_connections=config['http_pool_size'], pool_maxsize=config['http_pool_size'], max_retries=policy)
+    interface.mount('https://', adapter)
+    interface.mount('http://', adapter)
+    adapters.append(adapter)
+
+    # Timeouts
+    interface.timeout = (config['http_connect_timeout'], config['http_read_timeout'])
+
+
+# Returns connection pool and retry statistics
+def metrics():
+
+    sent = 0
+    opened = 0
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            sent += pool.num_requests
+            opened += pool.num_connections
+
+    return {
+        'requests'    : sent,
+        'connections' : opened,
+        'reused'      : sent - opened,
+        'retries'     : counts['retries'],
+        'timeouts'    : counts['timeouts']
+    }
@@ -22,7 +22,6 @@ import math
 import calendar
 import datetime
 import random
-import nltk
 
 # nltk.download('cmudict')
 # nltk.download('punkt')
@@ -223,4 +222,12 @@ def RepresentsInt(s):
         int(s)
         return True
     except ValueError:
-        return False
\ No newline at end of file
+        return False
+
+
+# Returns the generation number of a doc revision
+def revision(doc):
+    try:
+        return int(doc.get('_rev', '0').split('-')[0])
+    except (AttributeError, ValueError):
+        return 0
\ No newline at end of file